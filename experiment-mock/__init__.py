@@ -1,12 +1,27 @@
 from flask import Flask
-from . import routes
+from .asgi import AsgiApp
+from .config import load_config
+from .constants import ASGI_EXECUTOR_WORKERS
 
 
-def create_app():
+def create_app(config=None):
+    # routes, tomographs and numpy are imported by the first app, so importing package is fast
+    from . import routes
+    from .benchmark import benchmark_command, startup_benchmark_command
+    from .tomograph import create_registry
 
     app = Flask(__name__, instance_relative_config=True)
+    load_config(app, config)
+    # tomographs are created on first request to them
+    app.extensions['tomographs'] = create_registry(app.config)
 
     app.register_blueprint(routes.bp_main)
     app.register_blueprint(routes.bp_tomograph)
+    app.cli.add_command(benchmark_command)
+    app.cli.add_command(startup_benchmark_command)
 
     return app
+
+
+def create_asgi_app(executor_workers=ASGI_EXECUTOR_WORKERS, config=None):
+    return AsgiApp(create_app(config), executor_workers=executor_workers)
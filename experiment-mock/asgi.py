@@ -0,0 +1,191 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+# routes which only read tomograph state, they are answered right in event loop,
+# other routes (frames, experiments, storage requests) go to executor
+INLINE_ENDPOINTS = {
+    'main.main_route',
+    'tomograph.check_state',
+    'tomograph.state_snapshot',
+    'tomograph.source_get_voltage',
+    'tomograph.source_get_current',
+    'tomograph.shutter_state',
+    'tomograph.motor_get_horizontal_position',
+    'tomograph.motor_get_vertical_position',
+    'tomograph.motor_get_angle_position',
+    'tomograph.detector_get_chip_temperature',
+    'tomograph.detector_get_hous_temperature',
+}
+
+
+class AsgiApp:
+    # ASGI wrapper around Flask app, so the same blueprints serve many concurrent clients from one event loop
+    def __init__(self, flask_app, executor_workers):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='asgi-executor')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_http(self, scope, receive, send):
+        body = await read_body(receive)
+        environ = make_environ(scope, body)
+        loop = asyncio.get_event_loop()
+
+        if self.inline(environ):
+            status, headers, chunks = run_wsgi(self.flask_app, environ)
+            await send_start(send, status, headers)
+            for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            close_chunks(chunks)
+        else:
+            status, headers, chunks = await loop.run_in_executor(self.executor, run_wsgi, self.flask_app, environ)
+            await send_start(send, status, headers)
+            if any(name.lower() == 'content-length' for name, value in headers):
+                # body of known size is already made by route
+                for chunk in chunks:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                close_chunks(chunks)
+            elif not await stream_chunks(chunks, receive, send):
+                return
+
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    def inline(self, environ):
+        try:
+            endpoint, view_args = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False
+        if endpoint not in INLINE_ENDPOINTS:
+            return False
+        # tomograph is created by the first request to it, which takes long, so this request goes to executor
+        return 'tomo_num' not in view_args or self.flask_app.extensions['tomographs'].created(view_args['tomo_num'])
+
+
+async def stream_chunks(chunks, receive, send):
+    # endless response (progress events, live view) is iterated by its own thread, so it doesn't hold workers of
+    # executor; thread takes the next chunk only after the previous one is sent, and it closes the response
+    # when client disconnects; False if client disconnected
+    loop = asyncio.get_event_loop()
+    queue = asyncio.Queue()
+    chunk_sent = threading.Semaphore(0)
+    stopped = threading.Event()
+
+    def iterate():
+        try:
+            for chunk in chunks:
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                chunk_sent.acquire()
+                if stopped.is_set():
+                    break
+        finally:
+            close_chunks(chunks)
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    threading.Thread(target=iterate, name='asgi-stream', daemon=True).start()
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        while True:
+            next_chunk = asyncio.ensure_future(queue.get())
+            await asyncio.wait((next_chunk, disconnect), return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                next_chunk.cancel()
+                return False
+            chunk = next_chunk.result()
+            if chunk is None:
+                return True
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk_sent.release()
+    finally:
+        stopped.set()
+        chunk_sent.release()
+        disconnect.cancel()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def make_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_app, environ):
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    chunks = wsgi_app(environ, start_response)
+    return response['status'], response['headers'], chunks
+
+
+async def send_start(send, status, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+
+
+def close_chunks(chunks):
+    if hasattr(chunks, 'close'):
+        chunks.close()
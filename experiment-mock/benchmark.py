@@ -0,0 +1,315 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from .experiment import check_and_prepare_exp_parameters, create_storage_client
+from .scan_plan import ScanPlan
+from .storage_stub import StubStorageServer
+from .tomograph import Tomograph, create_timing_model
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# experiments are run with no hardware waits, so they measure frame generation, encoding and sending only
+BENCHMARK_CASES = (
+    {'name': 'small-npz', 'frame shape': (256, 256), 'dark': 5, 'empty': 5, 'steps': 40, 'count per step': 1,
+     'encoding': 'npz'},
+    {'name': 'small-npy', 'frame shape': (256, 256), 'dark': 5, 'empty': 5, 'steps': 40, 'count per step': 1,
+     'encoding': 'npy'},
+    {'name': 'small-fast-batch', 'frame shape': (256, 256), 'dark': 5, 'empty': 5, 'steps': 40,
+     'count per step': 1, 'encoding': 'fast', 'frame batch': 8},
+    {'name': 'medium-npz', 'frame shape': (1024, 1024), 'dark': 5, 'empty': 5, 'steps': 20, 'count per step': 2,
+     'encoding': 'npz'},
+    {'name': 'medium-fast', 'frame shape': (1024, 1024), 'dark': 5, 'empty': 5, 'steps': 20, 'count per step': 2,
+     'encoding': 'fast'},
+    {'name': 'medium-cached', 'frame shape': (1024, 1024), 'dark': 10, 'empty': 10, 'steps': 10,
+     'count per step': 4, 'encoding': 'npy', 'frame cache': True},
+    {'name': 'detector-npy', 'frame shape': (2500, 2500), 'dark': 2, 'empty': 2, 'steps': 6, 'count per step': 1,
+     'encoding': 'npy'},
+)
+
+BENCHMARK_ROUTES = (
+    '/tomograph/0/state',
+    '/tomograph/0/source/get-voltage',
+    '/tomograph/0/motor/get-angle-position',
+    '/tomograph/0/shutter/state',
+)
+
+# app of integration tests: small frames of noise, no hardware waits
+STARTUP_CONFIG = {
+    'TIMING_SPEEDUP': 0,
+    'DETECTOR_FRAME_HEIGHT': 64,
+    'DETECTOR_FRAME_WIDTH': 64,
+    'FRAME_SIMULATION': 'noise',
+}
+
+# import and the first app in new interpreter, it prints times and which slow modules are imported
+STARTUP_SCRIPT = '''
+import importlib, json, sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+package = importlib.import_module({package!r})
+imported = time.perf_counter()
+modules_after_import = [name for name in {modules!r} if name in sys.modules]
+app = package.create_app({config!r})
+created = time.perf_counter()
+app.test_client().get('/tomograph/0/state')
+print(json.dumps({{
+    'import': imported - start,
+    'create app': created - imported,
+    'first tomograph': time.perf_counter() - created,
+    'modules after import': modules_after_import,
+    'modules after first tomograph': [name for name in {modules!r} if name in sys.modules],
+}}))
+'''
+STARTUP_MODULES = ('flask', 'numpy', 'requests')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def experiment_parameters(case, exp_id):
+    exp_param = {
+        'exp_id': exp_id,
+        'advanced': False,
+        'DARK': {'count': case['dark'], 'exposure': 1.0},
+        'EMPTY': {'count': case['empty'], 'exposure': 1.0},
+        'DATA': {'step count': case['steps'], 'exposure': 1.0, 'angle step': 360.0 / case['steps'],
+                 'count per step': case['count per step']},
+        'frame encoding': case['encoding'],
+    }
+    if 'frame batch' in case:
+        exp_param['frame batch'] = {'count': case['frame batch']}
+    if 'frame cache' in case:
+        exp_param['frame cache'] = case['frame cache']
+
+    success, error = check_and_prepare_exp_parameters(exp_param)
+    if not success:
+        raise ValueError('Incorrect benchmark case {}: {}'.format(case['name'], error))
+    return exp_param
+
+
+def summary(values):
+    return {
+        'min': min(values),
+        'max': max(values),
+        'mean': statistics.mean(values),
+        'median': statistics.median(values),
+        'stddev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'rounds': len(values),
+    }
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024.0 / (1024.0 if sys.platform == 'darwin' else 1.0)
+
+
+def run_experiment_case(case, repeat, stub):
+    tomograph = Tomograph(tomo_num=0,
+                          timing=create_timing_model(speedup=0),
+                          frame_shape=case['frame shape'],
+                          storage_client=create_storage_client(stub.uri))
+    tomograph.source_set_voltage(40.0)
+    tomograph.source_set_current(40.0)
+
+    durations = []
+    received_bytes = 0
+    frames_count = 0
+    # the first round warms up caches, pools and connections and is not measured
+    for round_num in range(repeat + 1):
+        exp_param = experiment_parameters(case, '{}-{}'.format(case['name'], round_num))
+        bytes_before = stub.received_bytes
+        start = time.perf_counter()
+        tomograph.carry_out_simple_experiment(exp_param)
+        duration = time.perf_counter() - start
+        if tomograph.last_stop_latency is not None:
+            raise RuntimeError('Experiment of benchmark case {} was stopped'.format(case['name']))
+        if round_num:
+            durations.append(duration)
+            received_bytes += stub.received_bytes - bytes_before
+            frames_count = len(ScanPlan.compile(exp_param))
+
+    mean_duration = statistics.mean(durations)
+    return {
+        'case': case['name'],
+        'frame shape': list(case['frame shape']),
+        'encoding': case['encoding'],
+        'frames': frames_count,
+        'duration': summary(durations),
+        'frames per second': frames_count / mean_duration,
+        'sent MB per second': received_bytes / len(durations) / mean_duration / 1024 / 1024,
+        'storage': tomograph.storage_client.stats(),
+        'frame cache': tomograph.frame_cache.stats() if case.get('frame cache') else None,
+        'peak rss MB': peak_rss_mb(),
+    }
+
+
+def run_routes_case(app, clients, requests_count, routes=BENCHMARK_ROUTES):
+    # mock itself imports requests only for the first request to storage
+    import requests
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_uri = 'http://127.0.0.1:{}'.format(server.server_port)
+
+    latencies = {route: [] for route in routes}
+    lock = threading.Lock()
+
+    def client(client_num):
+        session = requests.Session()
+        for i in range(requests_count // clients):
+            route = routes[(client_num + i) % len(routes)]
+            start = time.perf_counter()
+            session.get(base_uri + route).raise_for_status()
+            latency = time.perf_counter() - start
+            with lock:
+                latencies[route].append(latency)
+
+    try:
+        # the first request creates tomograph, it is not measured
+        requests.get(base_uri + routes[0]).raise_for_status()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            list(executor.map(client, range(clients)))
+        duration = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    routes_results = {}
+    for route, values in latencies.items():
+        values.sort()
+        routes_results[route] = {'requests': len(values), 'mean': statistics.mean(values),
+                                 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95),
+                                 'max': values[-1]}
+    return {
+        'clients': clients,
+        'requests': sum(len(values) for values in latencies.values()),
+        'requests per second': sum(len(values) for values in latencies.values()) / duration,
+        'routes': routes_results,
+        'peak rss MB': peak_rss_mb(),
+    }
+
+
+def run_benchmarks(app, case_names=(), repeat=3, clients=8, requests_count=400):
+    cases = [case for case in BENCHMARK_CASES if not case_names or case['name'] in case_names]
+    results = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.time(),
+        'experiments': [],
+    }
+    with StubStorageServer() as stub:
+        for case in cases:
+            results['experiments'].append(run_experiment_case(case, repeat, stub))
+    if clients > 0 and requests_count > 0:
+        results['control routes'] = run_routes_case(app, clients, requests_count)
+    return results
+
+
+def run_import_case(rounds, config=STARTUP_CONFIG):
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    script = STARTUP_SCRIPT.format(path=os.path.dirname(package_dir), package=__package__,
+                                   modules=STARTUP_MODULES, config=config)
+    runs = []
+    for round_num in range(rounds):
+        start = time.perf_counter()
+        output = subprocess.check_output([sys.executable, '-c', script])
+        run = json.loads(output.decode().splitlines()[-1])
+        run['process'] = time.perf_counter() - start
+        runs.append(run)
+
+    results = {key: summary([run[key] for run in runs])
+               for key in ('process', 'import', 'create app', 'first tomograph')}
+    results['modules after import'] = runs[-1]['modules after import']
+    results['modules after first tomograph'] = runs[-1]['modules after first tomograph']
+    return results
+
+
+def run_instances_case(create_app, instances, config=STARTUP_CONFIG):
+    # isolated apps in one process, as integration tests create them: app, then the first tomograph
+    apps = []
+    create_times = []
+    first_request_times = []
+    for i in range(instances):
+        start = time.perf_counter()
+        app = create_app(config)
+        created = time.perf_counter()
+        app.test_client().get('/tomograph/0/state')
+        first_request_times.append(time.perf_counter() - created)
+        create_times.append(created - start)
+        apps.append(app)
+
+    return {
+        'instances': instances,
+        'create app': summary(create_times),
+        'first tomograph': summary(first_request_times),
+        'instance': summary([a + b for a, b in zip(create_times, first_request_times)]),
+        'peak rss MB': peak_rss_mb(),
+    }
+
+
+def run_startup_benchmarks(create_app, import_rounds=5, instances=200):
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'config': STARTUP_CONFIG,
+        'import': run_import_case(import_rounds),
+        'instances': run_instances_case(create_app, instances),
+    }
+
+
+@click.command('benchmark')
+@click.option('--case', 'case_names', multiple=True,
+              type=click.Choice([case['name'] for case in BENCHMARK_CASES]),
+              help='Experiment case to run, all cases if not given.')
+@click.option('--repeat', default=3, show_default=True, help='Measured rounds of each experiment case.')
+@click.option('--clients', default=8, show_default=True, help='Concurrent clients of control routes, 0 - skip.')
+@click.option('--requests', 'requests_count', default=400, show_default=True,
+              help='Requests to control routes by all clients.')
+@click.option('--output', type=click.File('w'), default='-', help='File for JSON results, stdout by default.')
+@with_appcontext
+def benchmark_command(case_names, repeat, clients, requests_count, output):
+    # flask benchmark --case small-npz --repeat 5 --output results.json
+    results = run_benchmarks(current_app._get_current_object(), case_names, repeat, clients, requests_count)
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+@click.command('benchmark-startup')
+@click.option('--imports', 'import_rounds', default=5, show_default=True,
+              help='New interpreters importing package and creating the first app.')
+@click.option('--instances', default=200, show_default=True, help='Apps created in this process.')
+@click.option('--output', type=click.File('w'), default='-', help='File for JSON results, stdout by default.')
+def startup_benchmark_command(import_rounds, instances, output):
+    # flask benchmark-startup --instances 500
+    from . import create_app
+    results = run_startup_benchmarks(create_app, import_rounds, instances)
+    json.dump(results, output, indent=2)
+    output.write('\n')
@@ -0,0 +1,46 @@
+import os
+
+from .constants import *
+
+# settings which can differ between apps in one process, defaults are taken from constants
+DEFAULT_CONFIG = {
+    'STORAGE_URI': STORAGE_URI,
+    'TOMOGRAPHS_COUNT': TOMOGRAPHS_COUNT,
+    'TIMING_SPEEDUP': TIMING_SPEEDUP,
+    'DETECTOR_FRAME_HEIGHT': DETECTOR_FRAME_HEIGHT,
+    'DETECTOR_FRAME_WIDTH': DETECTOR_FRAME_WIDTH,
+    'FRAME_SIMULATION': FRAME_SIMULATION,
+    'FRAME_SPOOL_DIR': FRAME_SPOOL_DIR,
+}
+
+# e.g. RBTM_MOCK_STORAGE_URI=http://storage:5006 RBTM_MOCK_TIMING_SPEEDUP=0
+ENV_PREFIX = 'RBTM_MOCK_'
+
+
+def config_from_env(environ=None):
+    # values of environment variables are converted to types of defaults
+    if environ is None:
+        environ = os.environ
+
+    config = {}
+    for key, default in DEFAULT_CONFIG.items():
+        value = environ.get(ENV_PREFIX + key)
+        if value is None:
+            continue
+        try:
+            config[key] = type(default)(value) if default is not None else value
+        except ValueError:
+            raise ValueError('Environment variable {} must be {}'.format(ENV_PREFIX + key, type(default).__name__))
+    return config
+
+
+def load_config(app, config=None):
+    # defaults, then environment, then config given to create_app: mapping or object with upper case attributes
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_mapping(config_from_env())
+    if config is None:
+        return
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    else:
+        app.config.from_object(config)
@@ -1,9 +1,85 @@
-FRAME_PNG_FILENAME = 'image.png'
+PREVIEW_DOWNSAMPLE_FACTOR = 4
+LIVE_VIEW_MAX_RATE = 30.0
 STORAGE_URI = 'http://localhost:5006'
 STORAGE_FRAMES_URI = "{}/storage/frames/post".format(STORAGE_URI)
+STORAGE_FRAMES_BATCH_URI = "{}/storage/frames/batch/post".format(STORAGE_URI)
 STORAGE_EXP_START_URI = "{}/storage/experiments/create".format(STORAGE_URI)
 STORAGE_EXP_FINISH_URI = "{}/storage/experiments/finish".format(STORAGE_URI)
 
 SUCCESSFUL_STOP_MSG = 'Experiment was finished successfully'
 EMERGENCY_STOP_MSG = 'Experiment was emergency stopped'
 SOMEONE_STOP_MSG = 'Experiment was stopped by someone'
+
+UPLOAD_WORKERS_COUNT = 4
+UPLOAD_QUEUE_SIZE = 8
+# processes compressing frames from shared memory (shared by all tomographs), 0 - upload workers compress
+# frames themselves; more upload workers are needed to keep many processes busy
+ENCODING_PROCESSES = 0
+
+DETECTOR_MODEL = 'Ximea xiRAY'
+DETECTOR_FRAME_HEIGHT = 2500
+DETECTOR_FRAME_WIDTH = 2500
+DETECTOR_FRAME_DTYPE = 'uint16'
+
+FRAME_SIMULATION = 'projection'  # 'projection' or 'noise'
+PHANTOM_SIZE = 128
+PHANTOM_PATH = None  # .npy volume (z, y, x), Shepp-Logan phantom is used if None
+PHANTOM_ATTENUATION = 3.0  # total attenuation along the longest ray through phantom
+DETECTOR_COUNTS_SCALE = 0.2  # counts per kV * mA * ms of exposure
+DETECTOR_DARK_LEVEL = 100
+DETECTOR_PIXELS_PER_X_UNIT = 1.0
+FRAME_NOISE_SEED = 0  # noise tile is the same in every run, frames differ only by windows taken from it
+
+# experiments with 'seed' parameter are replayed: frame noise depends only on seed and frame number,
+# timestamps are REPLAY_EPOCH plus time of experiment by timing model
+REPLAY_EPOCH = 1577836800.0  # 2020-01-01 00:00:00 UTC
+
+ADVANCED_FRAME_NUMBER_DIGITS = 6  # count of frames of advanced experiment isn't known before it's finished
+FRAME_ENCODING = 'npz'  # default, experiment can choose other by 'frame encoding' parameter
+
+# frames in one storage request, experiment can change it by 'frame batch' parameter; 1 - no batching
+FRAME_BATCH_COUNT = 1
+FRAME_BATCH_BYTES = 64 * 1024 * 1024
+FRAME_BATCH_DELAY = 1.0
+
+# experiments with 'frame cache' parameter take frames under the same conditions from cache of tomograph
+FRAME_CACHE_BYTES = 512 * 1024 * 1024
+FRAME_CACHE_DIR = None  # directory for memory-mapped cache files, cache is kept in memory if None
+
+# directory of spools of tomographs: requests to storage are written to memory-mapped ring file and sent
+# in order by background drainer, which waits while storage is down; None - no spool
+FRAME_SPOOL_DIR = None
+FRAME_SPOOL_BYTES = 4 * 1024 * 1024 * 1024  # ring file is sparse, only pending frames take disk space
+FRAME_SPOOL_FULL_TIMEOUT = 60.0  # experiment is stopped if spool has no room for frame so long
+FRAME_SPOOL_MAX_BACKOFF = 10.0
+
+STORAGE_CONNECT_TIMEOUT = 3.05
+STORAGE_READ_TIMEOUT = 30
+STORAGE_RETRIES = 3  # only for frames, posting of frame can be repeated safely
+STORAGE_RETRY_BACKOFF = 0.2
+
+AWAY_X_POSITION = -4200
+
+# timing of real rig in seconds, mock waits are divided by TIMING_SPEEDUP (0 - no waits at all)
+TIMING_SPEEDUP = 1.0
+MOTOR_ANGLE_SPEED = 20.0  # degrees per second
+MOTOR_X_SPEED = 1000.0  # position units per second
+SHUTTER_LATENCY = 0.05
+DETECTOR_READOUT_TIME = 0.1
+SOURCE_RAMP_TIME = 5.0
+SOURCE_OFF_PAUSE = 5.0
+DARK_SETTLE_TIME = 1.0
+
+MAX_EXPERIMENT_FRAMES = 1000000  # simple experiment with more frames is rejected before its scan plan is built
+PLAN_PREVIEW_FRAMES = 1000  # frames of scan plan returned by /experiment/plan at once, next ones are got by offset
+
+PROGRESS_HEARTBEAT = 15.0  # comment sent to progress watchers when there are no events so long
+PROGRESS_EVENTS_KEPT = 1024  # start, phase and finish events of the latest experiment replayed to watchers
+
+METRICS_ENABLED = True  # counters and timings of hot path for /metrics
+
+BATCH_MAX_STEPS = 256  # steps of one /batch request
+
+TOMOGRAPHS_COUNT = 16  # tomo_num from 0 to TOMOGRAPHS_COUNT - 1, tomographs are created on first request
+
+ASGI_EXECUTOR_WORKERS = 32
@@ -1,11 +1,40 @@
-import threading, time, json, requests
-from io import BytesIO
-from random import randint
+import json
+import threading
+import time
+from functools import lru_cache
 import numpy as np
-from scipy.ndimage import zoom
-import matplotlib.pyplot as plt
 
 from .constants import *
+from .frame_uploader import FrameSequencer
+from .frame_codecs import CODECS, BuffersStream, get_codec
+from .frame_batcher import FrameBatcher
+from .frame_spool import SpoolFullError
+from .process_encoder import ProcessEncoder
+from .frame_source import frame_rng
+from .storage_client import StorageClient, StorageError, StorageNotSupportedError
+from .preview import render_png
+from .instruction import InstructionError, compile_instruction, instruction_namespace
+from .scan_plan import ScanPlan, MODES, MODE_DARK, MODE_EMPTY, MODE_DATA, ORDERS, frames_count, check_plan_parameters
+from . import metrics
+from .fast_json import dumps
+
+# one pool of encoding processes for all tomographs
+process_encoder = ProcessEncoder(ENCODING_PROCESSES)
+
+
+def create_storage_client(storage_uri=STORAGE_URI):
+    return StorageClient(pool_size=UPLOAD_WORKERS_COUNT + 1,
+                         connect_timeout=STORAGE_CONNECT_TIMEOUT,
+                         read_timeout=STORAGE_READ_TIMEOUT,
+                         retries=STORAGE_RETRIES,
+                         backoff=STORAGE_RETRY_BACKOFF,
+                         storage_uri=storage_uri)
+
+
+@lru_cache(maxsize=None)
+def default_storage_client():
+    # for requests not related to any tomograph, each tomograph has its own client
+    return create_storage_client()
 
 
 class ModExpError(Exception):
@@ -25,14 +54,16 @@ class ModExpError(Exception):
                             error=self.error,
                             exception_message=self.exception_message)
 
-    def create_response(self):
-        response_dict = {
+    def to_response_dict(self):
+        return {
             'success': False,
             'exception message': self.exception_message,
             'error': self.error,
             'result': None,
         }
-        return json.dumps(response_dict)
+
+    def create_response(self):
+        return dumps(self.to_response_dict())
 
 
 def create_event(event_type, exp_id, MoF, exception_message='', error=''):
@@ -59,7 +90,34 @@ class Experiment:
     def __init__(self, tomograph, exp_param, FOSITW=5):
         self.tomograph = tomograph
         self.exp_id = exp_param['exp_id']
+        self.read_parameters(exp_param)
 
+        self.FOSITW = FOSITW
+        self.frame_codec = get_codec(exp_param.get('frame encoding', FRAME_ENCODING))
+
+        frame_batch = exp_param.get('frame batch', {})
+        self.frame_batcher = None
+        if frame_batch.get('count', FRAME_BATCH_COUNT) > 1:
+            self.frame_batcher = FrameBatcher(send_batch=self.send_frames_batch,
+                                              max_count=frame_batch.get('count', FRAME_BATCH_COUNT),
+                                              max_bytes=frame_batch.get('bytes', FRAME_BATCH_BYTES),
+                                              max_delay=frame_batch.get('time', FRAME_BATCH_DELAY))
+
+        self.seed = exp_param.get('seed')
+        self.use_frame_cache = exp_param.get('frame cache', False)
+        self.clock = 0.0  # time of experiment on real rig by timing model
+        self.frame_num = 0
+        self.last_frame_end = None
+        self.to_be_stopped = False
+        self.stop_exception = None
+        self.stop_event = threading.Event()
+        self.stop_lock = threading.Lock()
+        self.stop_time = None
+        self.upload_sequencer = FrameSequencer()
+        self.phase = None
+        self.start_time = time.time()
+
+    def read_parameters(self, exp_param):
         self.DARK_count = exp_param['DARK']['count']
         self.DARK_exposure = exp_param['DARK']['exposure']
 
@@ -71,80 +129,145 @@ class Experiment:
         self.DATA_angle_step = exp_param['DATA']['angle step']
         self.DATA_count_per_step = exp_param['DATA']['count per step']
 
-        frames_total_count = self.DARK_count + self.EMPTY_count + self.DATA_step_count * self.DATA_count_per_step
-        self.total_digits_count = len(str(abs(frames_total_count - 1)))
+        self.scan_plan = ScanPlan.compile(exp_param, initial_angle=self.tomograph.state.angle_position)
+        self.frames_count = len(self.scan_plan)
+        self.total_digits_count = len(str(abs(self.frames_count - 1)))
 
-        self.FOSITW = FOSITW
-
-        self.frame_num = 0
-        self.to_be_stopped = False
-        self.stop_exception = None
+    def stop(self, exception):
+        # interrupts waits of tomograph and drops queued frames right away, the first reason of stop is kept
+        with self.stop_lock:
+            if self.to_be_stopped:
+                return
+            self.stop_exception = exception
+            self.to_be_stopped = True
+            self.stop_time = time.time()
+        self.stop_event.set()
+        self.tomograph.frame_uploader.cancel()
 
     def get_and_send_frame(self, exposure, mode):
+        tomo_num = self.tomograph.tomo_num
+        metrics.ACQUISITION_GAP_SECONDS.observe_since(self.last_frame_end, tomo_num)
 
         if mode == 'dark':
-            raw_image_with_metadata = self.tomograph.get_frame(exposure=exposure, with_open_shutter=False,
-                                                               from_experiment=True)
+            frame = self.tomograph.get_frame(exposure=exposure, with_open_shutter=False, from_experiment=True)
         else:
-            raw_image_with_metadata = self.tomograph.get_frame(exposure=exposure, with_open_shutter=True,
-                                                               from_experiment=True)
-        # frame_dict = {  u'image_data':  {   'image': np.empty((10, 10)),    },  }
+            frame = self.tomograph.get_frame(exposure=exposure, with_open_shutter=True, from_experiment=True)
 
-        raw_image_with_metadata['mode'] = mode
-        raw_image_with_metadata['number'] = str(self.frame_num).zfill(self.total_digits_count)
+        frame.metadata.mode = mode
+        frame.metadata.number = str(self.frame_num).zfill(self.total_digits_count)
 
         send_to_webpage = (self.frame_num % self.FOSITW == 0)
+        frame_seq = self.frame_num
         self.frame_num += 1
 
-        # prepare_send_frame(raw_image_with_metadata,self,send_to_webpage)
-        thr = threading.Thread(target=prepare_send_frame, args=(raw_image_with_metadata, self, send_to_webpage))
-        thr.start()
-
-    def run(self):
-        self.to_be_stopped = False
-        self.stop_exception = None
-        self.tomograph.source_power_on(from_experiment=True)
-        self.collect_dark_frames()
-        self.collect_empty_frames()
-        self.collect_data_frames()
-        self.tomograph.source_power_off(from_experiment=True)
-        return
-
-    def collect_data_frames(self):
-        initial_angle = self.tomograph.get_angle(from_experiment=True)
-        initial_angle = initial_angle if initial_angle is not None else 0
-        self.tomograph.set_exposure(self.DATA_exposure, from_experiment=True)
-        data_angles = np.round((np.arange(0, self.DATA_step_count)) * self.DATA_angle_step + initial_angle, 2) % 360
+        self.set_phase(mode)
+        # blocks when upload queue is full, so acquisition can't run ahead of storage
+        start = metrics.clock()
+        self.tomograph.frame_uploader.submit(self, frame, send_to_webpage, frame_seq)
+        metrics.UPLOAD_SUBMIT_WAIT_SECONDS.observe_since(start, tomo_num)
+        # event of every frame is made only while someone watches progress
+        if self.tomograph.progress.subscribers:
+            self.tomograph.progress.publish('progress', self.progress_event())
+        self.last_frame_end = metrics.clock()
+
+    def set_phase(self, phase):
+        if phase != self.phase:
+            self.phase = phase
+            self.tomograph.progress.publish('phase', self.progress_event())
+
+    def progress_event(self):
+        elapsed = time.time() - self.start_time
+        eta = None
+        if self.frames_count is not None and self.frame_num > 0:
+            eta = elapsed / self.frame_num * (self.frames_count - self.frame_num)
+        return {
+            'exp_id': self.exp_id,
+            'phase': self.phase,
+            'frame': self.frame_num,
+            'total': self.frames_count,
+            'sent': self.upload_sequencer.next_frame,
+            'angle': self.tomograph.state.angle_position,
+            'upload queue': self.tomograph.frame_uploader.queue_depth(),
+            'elapsed': elapsed,
+            'eta': eta,
+        }
 
-        exp_angles = data_angles
+    def frame_rng(self):
+        # None - frame takes random noise, replayed frame depends only on seed and its number
+        if self.seed is None:
+            return None
+        return frame_rng(self.seed, self.frame_num)
+
+    def wait_uploads(self):
+        self.upload_sequencer.wait_all(self.frame_num)
+
+    def flush_frames(self):
+        if self.frame_batcher is not None:
+            self.frame_batcher.flush()
+
+    def send_frames_batch(self, index, frames_data):
+        storage_client = self.tomograph.storage_client
+        frame_spool = self.tomograph.frame_spool
+        if frame_spool is not None:
+            # drainer splits batch if storage doesn't support batches
+            send_frames_batch_to_storage(self.exp_id, index, frames_data, self.frame_codec, frame_spool=frame_spool)
+            return
+
+        if not storage_client.batches_unsupported:
+            try:
+                send_frames_batch_to_storage(self.exp_id, index, frames_data, self.frame_codec, storage_client)
+                return
+            except StorageNotSupportedError:
+                # old storage, frames are sent one by one from now on
+                storage_client.batches_unsupported = True
 
-        self.tomograph.move_back(from_experiment=True)
-        self.tomograph.open_shutter(0, from_experiment=True)
-        for current_angle in exp_angles:
-            self.check_source()
-            self.tomograph.set_angle(float(current_angle), from_experiment=True)
+        for frame_index, data in zip(index, frames_data):
+            frame_metadata_event = create_event(event_type='frame', exp_id=self.exp_id, MoF=frame_index['frame'])
+            send_frame_to_storage_webpage(frame_metadata_event, BuffersStream([data]), send_to_webpage=False,
+                                          codec=self.frame_codec, storage_client=storage_client)
 
-            for j in range(0, self.DATA_count_per_step):
-                self.get_and_send_frame(exposure=None, mode='data')
+    def run(self):
+        # tomograph is set up only where plan changes mode, angle or exposure, frames between are taken in a row
+        entries = self.scan_plan.entries
+        modes = entries['mode'].tolist()
+        angles = entries['angle'].tolist()
+        exposures = entries['exposure'].tolist()
+        block_starts = self.scan_plan.block_starts().tolist() + [len(entries)]
 
-        self.tomograph.close_shutter(0, from_experiment=True)
+        self.tomograph.source_power_on(from_experiment=True)
+        mode = None
+        exposure = None
+        for start, end in zip(block_starts[:-1], block_starts[1:]):
+            if modes[start] != mode:
+                mode = modes[start]
+                self.prepare_mode(mode)
+            if exposures[start] != exposure:
+                exposure = exposures[start]
+                self.tomograph.set_exposure(exposure, from_experiment=True)
+            if mode != MODE_DARK:
+                self.check_source()
+            if mode == MODE_DATA:
+                self.tomograph.set_angle(angles[start], from_experiment=True)
+
+            mode_name = MODES[mode]
+            for i in range(end - start):
+                self.get_and_send_frame(exposure=None, mode=mode_name)
 
-    def collect_empty_frames(self):
-        self.tomograph.move_away(from_experiment=True)
-        self.tomograph.set_exposure(self.EMPTY_exposure, from_experiment=True)
-        self.tomograph.open_shutter(0, from_experiment=True)
-        for i in range(0, self.EMPTY_count):
-            self.check_source()
-            self.get_and_send_frame(exposure=None, mode='empty')
         self.tomograph.close_shutter(0, from_experiment=True)
         self.tomograph.move_back(from_experiment=True)
+        self.tomograph.source_power_off(from_experiment=True)
 
-    def collect_dark_frames(self):
-        self.tomograph.close_shutter(0, from_experiment=True)
-        time.sleep(1.0)
-        self.tomograph.set_exposure(self.DARK_exposure, from_experiment=True)
-        for i in range(0, self.DARK_count):
-            self.get_and_send_frame(exposure=None, mode='dark')
+    def prepare_mode(self, mode):
+        self.set_phase(MODES[mode])
+        if mode == MODE_DARK:
+            self.tomograph.close_shutter(0, from_experiment=True)
+            self.tomograph.wait(self.tomograph.timing.dark_settle_time, from_experiment=True)
+        elif mode == MODE_EMPTY:
+            self.tomograph.move_away(from_experiment=True)
+            self.tomograph.open_shutter(0, from_experiment=True)
+        else:
+            self.tomograph.move_back(from_experiment=True)
+            self.tomograph.open_shutter(0, from_experiment=True)
 
     def check_source(self):
 
@@ -159,95 +282,208 @@ class Experiment:
         print('current = {0}, voltage = {1}'.format(current, voltage))
 
         self.tomograph.source_power_off(from_experiment=True)
-        time.sleep(5)
+        self.tomograph.wait(self.tomograph.timing.source_off_pause, from_experiment=True)
+        # power on waits for source ramp
         self.tomograph.source_power_on(from_experiment=True)
-        time.sleep(5)
+
+
+class AdvancedExperiment(Experiment):
+    def read_parameters(self, exp_param):
+        if 'instruction code' not in exp_param.keys():
+            exp_param['instruction code'] = compile_instruction(exp_param['instruction'])
+        self.instruction_code = exp_param['instruction code']
+        self.frames_count = None
+        self.total_digits_count = ADVANCED_FRAME_NUMBER_DIGITS
+
+    def run(self):
+        # functions of instruction take frames and send them by the same upload pipeline as simple experiment
+        try:
+            exec(self.instruction_code, instruction_namespace(self))
+        except ModExpError:
+            raise
+        except InstructionError as e:
+            raise ModExpError(error='Error in instruction', exception_message=e.message)
+        except Exception as e:
+            raise ModExpError(error='Error in instruction', exception_message='{}: {}'.format(type(e).__name__, e))
 
 
 # Frame functions
-def prepare_send_frame(raw_image_with_metadata, experiment, send_to_webpage=False):
-    raw_image = raw_image_with_metadata['image_data']['raw_image']
-    del raw_image_with_metadata['image_data']['raw_image']
-    frame_metadata = raw_image_with_metadata
+def prepare_send_frame(frame, experiment, send_to_webpage=False, frame_seq=None):
+    raw_image = frame.raw_image
+    cache_key = frame.cache_key
+    start = metrics.clock()
 
     try:
-        # experiment = 1
         try:
-            # image_numpy = np.zeros((100, 100))
-            image_numpy = np.random.randint(0, randint(0, 65535), (2500, 2500))
+            image_numpy = np.asarray(raw_image)
         except Exception as e:
-            raise ModExpError(error='Could not convert raw image to numpy.array', exception_message=e.message)
+            raise ModExpError(error='Could not convert raw image to numpy.array', exception_message=str(e))
 
         if experiment:
-            pass
+            frame.metadata.encoding = experiment.frame_codec.name
+            # metadata becomes dict only here, it is serialized once with the request
+            frame_metadata = frame.metadata.to_dict()
             frame_metadata_event = create_event(event_type='frame', exp_id=experiment.exp_id, MoF=frame_metadata)
-            # frame_metadata_event = create_event(event_type='frame', exp_id=1, MoF=frame_metadata)
-            send_frame_to_storage_webpage(frame_metadata_event=frame_metadata_event,
-                                          image_numpy=image_numpy,
-                                          send_to_webpage=send_to_webpage)
-        else:
-            make_png(image_numpy)
+            # frames are encoded by workers in parallel and only sent in order
+            codec = experiment.frame_codec
+            block_name = experiment.tomograph.frame_source.block_name(raw_image)
+            encode_start = metrics.clock()
+            if cache_key is not None:
+                frame_data = experiment.tomograph.frame_cache.get_encoded(
+                    cache_key, codec.name, lambda: process_encoder.encode(codec, image_numpy, block_name))
+                frame_file = BuffersStream([frame_data])
+            else:
+                frame_file = process_encoder.encode(codec, image_numpy, block_name)
+                if experiment.frame_batcher is not None:
+                    # batch outlives frame buffer, so encoded frame is copied
+                    frame_data = frame_file.read()
+            metrics.FRAME_ENCODE_SECONDS.observe_since(encode_start, codec.name)
+
+            if frame_seq is not None:
+                experiment.upload_sequencer.wait_turn(frame_seq)
+            # experiment could be stopped while frame was waiting for its turn
+            if experiment.to_be_stopped:
+                return False, experiment.stop_exception
+
+            if experiment.frame_batcher is not None:
+                experiment.frame_batcher.add(frame_metadata, frame_data)
+            else:
+                send_frame_to_storage_webpage(frame_metadata_event=frame_metadata_event,
+                                              frame_file=frame_file,
+                                              send_to_webpage=send_to_webpage,
+                                              codec=experiment.frame_codec,
+                                              storage_client=experiment.tomograph.storage_client,
+                                              frame_spool=experiment.tomograph.frame_spool)
 
     except ModExpError as e:
         if experiment is not None:
-            experiment.stop_exception = e
-            experiment.to_be_stopped = True
+            metrics.FRAMES_FAILED.inc(experiment.tomograph.tomo_num)
+            experiment.stop(e)
         return False, e
+    except Exception as e:
+        e = ModExpError(error='Could not send frame', exception_message=str(e))
+        if experiment is not None:
+            metrics.FRAMES_FAILED.inc(experiment.tomograph.tomo_num)
+            experiment.stop(e)
+        return False, e
+    finally:
+        if experiment is not None:
+            experiment.tomograph.frame_source.release(raw_image)
 
+    if experiment is not None:
+        metrics.PREPARE_SEND_FRAME_SECONDS.observe_since(start, experiment.tomograph.tomo_num)
+        metrics.FRAMES_SENT.inc(experiment.tomograph.tomo_num)
     return True, None
 
 
-def send_frame_to_storage_webpage(frame_metadata_event, image_numpy, send_to_webpage):
+def discard_frame(frame, experiment):
+    metrics.FRAMES_DISCARDED.inc(experiment.tomograph.tomo_num)
+    experiment.tomograph.frame_source.release(frame.raw_image)
 
-    s = BytesIO()
-    np.savez_compressed(s, frame_data=image_numpy)
-    s.seek(0)
-    data = {'data': json.dumps(frame_metadata_event)}
-    files = {'file': s}
-    send_to_storage(storage_uri=STORAGE_FRAMES_URI, data=data, files=files)
 
+def send_frame_to_storage_webpage(frame_metadata_event, frame_file, send_to_webpage, codec=None, storage_client=None,
+                                  frame_spool=None):
+    if codec is None:
+        codec = get_codec(FRAME_ENCODING)
 
-def send_to_storage(storage_uri, data, files=None):
+    data = {'data': dumps(frame_metadata_event)}
+    if frame_spool is not None:
+        spool_request(frame_spool, STORAGE_FRAMES_URI, data, codec.file_name, frame_file)
+        return
+    files = {'file': (codec.file_name, frame_file)}
+    send_to_storage(storage_uri=STORAGE_FRAMES_URI, data=data, files=files, idempotent=True,
+                    storage_client=storage_client)
+
+
+def send_frames_batch_to_storage(exp_id, index, frames_data, codec, storage_client=None, frame_spool=None):
+    # one request with frames one after another in file and their metadata with offsets in 'data'
+    batch_event = {
+        'type': 'frames',
+        'exp_id': exp_id,
+        'frames': index,
+    }
+    data = {'data': dumps(batch_event)}
+    if frame_spool is not None:
+        spool_request(frame_spool, STORAGE_FRAMES_BATCH_URI, data, codec.file_name + '.batch',
+                      BuffersStream(frames_data))
+        return
+    files = {'file': (codec.file_name + '.batch', BuffersStream(frames_data))}
     try:
-        storage_resp = requests.post(storage_uri, files=files, data=data)
-    except Exception as e:
-        raise ModExpError(error='Problems with storage', exception_message='Could not send to storage' """e.message""")
+        storage_client.post(STORAGE_FRAMES_BATCH_URI, data=data, files=files, idempotent=True)
+    except StorageNotSupportedError:
+        raise
+    except StorageError as e:
+        raise ModExpError(error='Problems with storage', exception_message=e.message)
 
-    try:
-        storage_resp_dict = json.loads(storage_resp.content)
-    except (ValueError, TypeError):
-        raise ModExpError(error='Problems with storage', exception_message='Storage\'s response is not JSON')
 
-    if not ('result' in storage_resp_dict.keys()):
-        raise ModExpError(error='Problems with storage',
-                          exception_message="Storage\'s response has incorrect format (no 'result' key)")
+def send_to_storage(storage_uri, data, files=None, idempotent=False, storage_client=None):
+    if storage_client is None:
+        storage_client = default_storage_client()
 
-    if storage_resp_dict['result'] != 'success':
-        raise ModExpError(error='Problems with storage',
-                          exception_message='Storage\'s response:  ' + str(storage_resp_dict['result']))
+    try:
+        storage_client.post(storage_uri, data=data, files=files, idempotent=idempotent)
+    except StorageError as e:
+        raise ModExpError(error='Problems with storage', exception_message=e.message)
 
 
-def make_png(image_numpy, png_filename=FRAME_PNG_FILENAME):
-    res = image_numpy
+def spool_request(frame_spool, uri, data, file_name=None, frame_file=None):
+    # acquisition goes on at disk speed, storage gets request later from drainer of spool
     try:
+        frame_spool.append(uri, data, file_name, frame_file)
+    except SpoolFullError as e:
+        raise ModExpError(error='Problems with storage', exception_message=e.message)
 
-        small_res = zoom(np.rot90(res), zoom=0.25, order=0)
-        fig = plt.figure()
-        img = plt.imshow(small_res)
-        fig.colorbar(img)
-        fig.tight_layout()
-        plt.gray()
-        plt.axis('off')
-        plt.savefig(png_filename)
 
+def send_spooled_request(storage_client, uri, data, file_name, frame_file):
+    # called by drainer of spool, request is sent again after any error
+    files = {'file': (file_name, frame_file)} if file_name is not None else None
+    if uri != STORAGE_FRAMES_BATCH_URI:
+        storage_client.post(uri, data=data, files=files, idempotent=files is not None)
+        return
+
+    if not storage_client.batches_unsupported:
+        try:
+            storage_client.post(uri, data=data, files=files, idempotent=True)
+            return
+        except StorageNotSupportedError:
+            storage_client.batches_unsupported = True
+
+    # old storage, frames of batch are sent one by one
+    batch_event = json.loads(data['data'])
+    batch = frame_file.read()
+    frame_file_name = file_name[:-len('.batch')]
+    for frame_index in batch_event['frames']:
+        frame_metadata_event = create_event(event_type='frame', exp_id=batch_event['exp_id'], MoF=frame_index['frame'])
+        frame_data = batch[frame_index['offset']:frame_index['offset'] + frame_index['size']]
+        storage_client.post(STORAGE_FRAMES_URI, data={'data': dumps(frame_metadata_event)},
+                            files={'file': (frame_file_name, BuffersStream([frame_data]))}, idempotent=True)
+
+
+def make_png(image_numpy, width=None, height=None, low=None, high=None):
+    try:
+        return render_png(image_numpy, width=width, height=height, low=low, high=high,
+                          default_factor=PREVIEW_DOWNSAMPLE_FACTOR)
     except Exception as e:
-        raise ModExpError(error="Could not make png-file from image", exception_message=e.message)
+        raise ModExpError(error="Could not make png-file from image", exception_message=str(e))
+
+
+def send_exp_start_to_storage(request_data, storage_client=None, frame_spool=None):
+    if frame_spool is not None:
+        # experiment comes to storage after requests of previous experiments left in spool, and it starts
+        # while storage is down
+        spool_request(frame_spool, STORAGE_EXP_START_URI, request_data.decode('utf-8'))
+        return
+    send_to_storage(STORAGE_EXP_START_URI, data=request_data, storage_client=storage_client)
 
 
-def send_message_to_storage_webpage(event_dict):
-    event_json_for_storage = json.dumps(event_dict)
+def send_message_to_storage_webpage(event_dict, storage_client=None, frame_spool=None):
+    event_json_for_storage = dumps(event_dict)
+    if frame_spool is not None:
+        # message of experiment finish comes to storage after all its frames
+        spool_request(frame_spool, STORAGE_EXP_FINISH_URI, event_json_for_storage)
+        return
     try:
-        send_to_storage(STORAGE_EXP_FINISH_URI, data=event_json_for_storage)
+        send_to_storage(STORAGE_EXP_FINISH_URI, data=event_json_for_storage, storage_client=storage_client)
     except ModExpError as e:
         raise ModExpError(error="Could not message to storage", exception_message=e.message)
 
@@ -268,6 +504,10 @@ def check_and_prepare_exp_parameters(exp_param):
             return False, 'Unacceptable instruction, there must not be substring ".__"'
         if exp_param['instruction'].find("t_0M_o_9_r_") != -1:
             return False, 'Unacceptable instruction, there must not be substring "t_0M_o_9_r_"'
+        try:
+            exp_param['instruction code'] = compile_instruction(exp_param['instruction'])
+        except InstructionError as e:
+            return False, e.message
     else:
         if not (('DARK' in exp_param.keys()) and ('EMPTY' in exp_param.keys()) and ('DATA' in exp_param.keys())):
             return False, 'Incorrect format3'
@@ -305,6 +545,49 @@ def check_and_prepare_exp_parameters(exp_param):
         if exp_param['DATA']['exposure'] < 0.1:
             return False, 'Bad parameters in \'DATA\' parameters'
 
+        # counts are sizes of blocks of scan plan, so they are checked before plan is compiled
+        if exp_param['DARK']['count'] < 0:
+            return False, 'Bad parameters in \'DARK\' parameters: count must be non-negative'
+        if exp_param['EMPTY']['count'] < 0:
+            return False, 'Bad parameters in \'EMPTY\' parameters: count must be non-negative'
+        if exp_param['DATA']['step count'] < 0 or exp_param['DATA']['count per step'] < 0:
+            return False, 'Bad parameters in \'DATA\' parameters: step count and count per step must be non-negative'
+
+        if exp_param['DATA'].get('order', 'sequential') not in ORDERS:
+            return False, 'Incorrect format in \'DATA\' parameters: order must be one of: ' + ', '.join(ORDERS)
+        if 'interleave' in exp_param['EMPTY'].keys():
+            if not ((type(exp_param['EMPTY']['interleave']) is int) and exp_param['EMPTY']['interleave'] >= 0):
+                return False, 'Incorrect format in \'EMPTY\' parameters: interleave must be non-negative int'
+
+        if frames_count(exp_param) > MAX_EXPERIMENT_FRAMES:
+            return False, 'Too many frames in experiment, maximum is {}'.format(MAX_EXPERIMENT_FRAMES)
+        success, error = check_plan_parameters(exp_param)
+        if not success:
+            return False, error
+
+    if 'seed' in exp_param.keys():
+        if not (type(exp_param['seed']) is int and 0 <= exp_param['seed'] < 2 ** 32):
+            return False, 'Incorrect format: seed must be int from 0 to 2**32 - 1'
+
+    if 'frame cache' in exp_param.keys():
+        if not (type(exp_param['frame cache']) is bool):
+            return False, 'Incorrect format: frame cache must be bool'
+
+    if 'frame batch' in exp_param.keys():
+        frame_batch = exp_param['frame batch']
+        if not (type(frame_batch) is dict):
+            return False, 'Incorrect format: frame batch must be dict'
+        for key, key_type in (('count', int), ('bytes', int), ('time', float)):
+            if key in frame_batch.keys() and not (type(frame_batch[key]) is key_type and frame_batch[key] > 0):
+                return False, 'Incorrect format in \'frame batch\' parameters: {} must be positive {}'.format(
+                    key, key_type.__name__)
+
+    if 'frame encoding' in exp_param.keys():
+        if not (type(exp_param['frame encoding']) is str):
+            return False, 'Incorrect format: frame encoding must be string'
+        if exp_param['frame encoding'] not in CODECS.keys():
+            return False, 'Unknown frame encoding, available: ' + ', '.join(sorted(CODECS.keys()))
+
     # we don't multiply and round  exp_param['DATA']['angle step'] here, we will do it during experiment,
     # because it will be more accurate this way
     return True, ''
@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+class FrameBatcher:
+    # collects encoded frames of one experiment and sends them by one request when batch is full,
+    # when mode of frames changes (dark, empty, data) or when oldest frame waits longer than max_delay;
+    # error of batch sent by timer is raised by the next add or flush
+    def __init__(self, send_batch, max_count, max_bytes, max_delay):
+        self.send_batch = send_batch
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.lock = threading.RLock()
+        self.frames = []
+        self.bytes_count = 0
+        self.mode = None
+        self.first_frame_time = None
+        self.batch_num = 0
+        self.timer = None
+        self.error = None
+
+    def add(self, frame_metadata, data):
+        with self.lock:
+            self.raise_error()
+            if self.frames and (frame_metadata['mode'] != self.mode
+                                or time.time() - self.first_frame_time > self.max_delay):
+                self.flush()
+
+            if not self.frames:
+                self.mode = frame_metadata['mode']
+                self.first_frame_time = time.time()
+                # batch is sent in time even when no frame comes after it, e.g. while source restarts
+                self.timer = threading.Timer(self.max_delay, self.flush_in_time, args=(self.batch_num,))
+                self.timer.daemon = True
+                self.timer.start()
+            self.frames.append((frame_metadata, data))
+            self.bytes_count += len(data)
+
+            if len(self.frames) >= self.max_count or self.bytes_count >= self.max_bytes:
+                self.flush()
+
+    def flush_in_time(self, batch_num):
+        with self.lock:
+            # batch of timer could be sent already
+            if batch_num != self.batch_num:
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+
+    def raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def flush(self):
+        with self.lock:
+            self.raise_error()
+            if not self.frames:
+                return
+            self.batch_num += 1
+            self.timer.cancel()
+            self.timer = None
+            frames = self.frames
+            self.frames = []
+            self.bytes_count = 0
+
+            # index of batch: metadata of every frame with offset and size of its data in batch file
+            index = []
+            offset = 0
+            for frame_metadata, data in frames:
+                index.append({'frame': frame_metadata, 'offset': offset, 'size': len(data)})
+                offset += len(data)
+            self.send_batch(index, [data for frame_metadata, data in frames])
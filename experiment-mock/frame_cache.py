@@ -0,0 +1,131 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class CacheEntry:
+    def __init__(self, frame, paths):
+        self.frame = frame
+        self.encoded = {}
+        self.paths = paths
+        self.size = frame.nbytes
+
+
+class FrameCache:
+    # frames taken under the same conditions and their encoded bytes, least recently used are evicted
+    # when cache is bigger than max_bytes; with directory they are kept in memory-mapped files
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        self.entries = OrderedDict()
+        self.bytes_count = 0
+        self.lock = threading.Lock()
+        self.frame_hits = 0
+        self.frame_misses = 0
+        self.encoded_hits = 0
+        self.encoded_misses = 0
+        self.evictions = 0
+
+    def get_frame(self, key, render):
+        # cached frame is read-only, so frame pool never takes it
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.frame_hits += 1
+                return entry.frame
+            self.frame_misses += 1
+
+        frame = render()
+        paths = []
+        if self.directory is None:
+            stored = frame.copy()
+            stored.flags.writeable = False
+        else:
+            path = self.file_path(key, 'npy')
+            np.save(path, frame)
+            stored = np.load(path, mmap_mode='r')
+            paths.append(path)
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = CacheEntry(stored, paths)
+                self.bytes_count += stored.nbytes
+                self.evict()
+        return frame
+
+    def get_encoded(self, key, codec_name, encode):
+        # bytes of frame encoded by codec, frame is encoded only once while its entry is in cache
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and codec_name in entry.encoded:
+                self.entries.move_to_end(key)
+                self.encoded_hits += 1
+                return entry.encoded[codec_name]
+            self.encoded_misses += 1
+
+        data = encode().read()
+        if entry is None:
+            return data
+
+        if self.directory is not None:
+            path = self.file_path(key, codec_name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with self.lock:
+            # entry could be evicted while frame was encoded
+            if self.entries.get(key) is entry and codec_name not in entry.encoded:
+                entry.encoded[codec_name] = data
+                entry.size += len(data)
+                self.bytes_count += len(data)
+                if self.directory is not None:
+                    entry.paths.append(path)
+                self.evict()
+        return data
+
+    def evict(self):
+        while self.bytes_count > self.max_bytes and self.entries:
+            key, entry = self.entries.popitem(last=False)
+            self.bytes_count -= entry.size
+            self.evictions += 1
+            for path in entry.paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def file_path(self, key, extension):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, '{}.{}'.format(digest, extension))
+
+    def clear(self):
+        with self.lock:
+            max_bytes = self.max_bytes
+            self.max_bytes = 0
+            self.evict()
+            self.max_bytes = max_bytes
+
+    def stats(self):
+        with self.lock:
+            frame_requests = self.frame_hits + self.frame_misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes_count,
+                'max bytes': self.max_bytes,
+                'memory-mapped': self.directory is not None,
+                'frame hits': self.frame_hits,
+                'frame misses': self.frame_misses,
+                'frame hit ratio': self.frame_hits / frame_requests if frame_requests else None,
+                'encoded hits': self.encoded_hits,
+                'encoded misses': self.encoded_misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,160 @@
+import io
+import zipfile
+import zlib
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def npy_header(image_numpy):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, np.lib.format.header_data_from_array_1_0(image_numpy))
+    return header.getvalue()
+
+
+def npy_parts(image_numpy):
+    # .npy file as header and memoryview of pixels, so pixels are not copied
+    image_numpy = np.ascontiguousarray(image_numpy)
+    return npy_header(image_numpy), memoryview(image_numpy).cast('B')
+
+
+class BuffersStream(io.RawIOBase):
+    # read-only file object over several buffers, reads slices of them without joining
+    def __init__(self, buffers):
+        self.buffers = [memoryview(b).cast('B') for b in buffers]
+        self.buffer_num = 0
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        sizes = [len(b) for b in self.buffers]
+        if whence == io.SEEK_CUR:
+            offset += sum(sizes[:self.buffer_num]) + self.position
+        elif whence == io.SEEK_END:
+            offset += sum(sizes)
+        offset = max(0, min(offset, sum(sizes)))
+
+        position = offset
+        self.buffer_num = 0
+        while self.buffer_num < len(sizes) and position >= sizes[self.buffer_num]:
+            position -= sizes[self.buffer_num]
+            self.buffer_num += 1
+        self.position = position
+        return offset
+
+    def tell(self):
+        return self.seek(0, io.SEEK_CUR)
+
+    def readinto(self, b):
+        target = memoryview(b).cast('B')
+        written = 0
+        while written < len(target) and self.buffer_num < len(self.buffers):
+            buffer = self.buffers[self.buffer_num]
+            count = min(len(target) - written, len(buffer) - self.position)
+            target[written:written + count] = buffer[self.position:self.position + count]
+            written += count
+            self.position += count
+            if self.position == len(buffer):
+                self.buffer_num += 1
+                self.position = 0
+        return written
+
+
+class FrameCodec:
+    name = None
+    file_name = 'frame'
+    compressed = True
+
+    def encode(self, image_numpy):
+        raise NotImplementedError
+
+
+class NpzCodec(FrameCodec):
+    name = 'npz'
+    file_name = 'frame.npz'
+
+    def encode(self, image_numpy):
+        # the same archive as np.savez_compressed makes, but with fixed date, so equal frames give equal bytes
+        s = io.BytesIO()
+        info = zipfile.ZipInfo('frame_data.npy', date_time=(1980, 1, 1, 0, 0, 0))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(s, 'w') as archive:
+            with archive.open(info, 'w', force_zip64=True) as f:
+                for part in npy_parts(image_numpy):
+                    f.write(part)
+        s.seek(0)
+        return s
+
+
+class NpyCodec(FrameCodec):
+    name = 'npy'
+    file_name = 'frame.npy'
+    compressed = False
+
+    def encode(self, image_numpy):
+        return io.BufferedReader(BuffersStream(npy_parts(image_numpy)))
+
+
+class CompressedNpyCodec(FrameCodec):
+    # .npy bytes compressed by streaming compressor
+    def __init__(self, name, compressobj):
+        self.name = name
+        self.file_name = 'frame.npy.' + name
+        self.compressobj = compressobj
+
+    def encode(self, image_numpy):
+        compressor = self.compressobj()
+        s = io.BytesIO()
+        for part in npy_parts(image_numpy):
+            s.write(compressor.compress(part))
+        s.write(compressor.flush())
+        s.seek(0)
+        return s
+
+
+class LZ4Compressor:
+    # compressobj-like wrapper: frame header of begin() goes before the first compressed chunk
+    def __init__(self):
+        self.compressor = lz4_frame.LZ4FrameCompressor()
+        self.header = self.compressor.begin()
+
+    def compress(self, data):
+        chunk = self.header + self.compressor.compress(data)
+        self.header = b''
+        return chunk
+
+    def flush(self):
+        chunk = self.header + self.compressor.flush()
+        self.header = b''
+        return chunk
+
+
+CODECS = {
+    'npz': NpzCodec(),
+    'npy': NpyCodec(),
+    'zlib': CompressedNpyCodec('zlib', lambda: zlib.compressobj(1)),
+}
+if lz4_frame is not None:
+    CODECS['lz4'] = CompressedNpyCodec('lz4', LZ4Compressor)
+if zstandard is not None:
+    CODECS['zstd'] = CompressedNpyCodec('zstd', lambda: zstandard.ZstdCompressor(level=1).compressobj())
+
+# the fastest compressor that is installed
+CODECS['fast'] = CODECS.get('lz4') or CODECS.get('zstd') or CODECS['zlib']
+
+
+def get_codec(name):
+    return CODECS[name]
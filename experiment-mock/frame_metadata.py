@@ -0,0 +1,58 @@
+import datetime
+from collections import namedtuple
+
+# frame taken by tomograph: pixels in pooled buffer, metadata record and key of frame cache (or None)
+Frame = namedtuple('Frame', ('raw_image', 'metadata', 'cache_key'))
+
+
+class FrameMetadata:
+    # metadata is kept as attributes until frame is sent, to_dict gives structure sent to storage
+    __slots__ = ('timestamp', 'utc', 'model', 'state', 'seed', 'cached', 'mode', 'number', 'encoding')
+
+    def __init__(self, timestamp, model, state, seed=None, utc=False):
+        self.timestamp = timestamp
+        self.utc = utc
+        self.model = model
+        self.state = state
+        self.seed = seed
+        self.cached = False
+        self.mode = None
+        self.number = None
+        self.encoding = None
+
+    def datetime(self):
+        if self.utc:
+            timestamp_datetime = datetime.datetime.fromtimestamp(self.timestamp, datetime.timezone.utc)
+        else:
+            timestamp_datetime = datetime.datetime.fromtimestamp(self.timestamp)
+        return timestamp_datetime.strftime("%d.%m.%Y %H:%M:%S")
+
+    def to_dict(self):
+        state = self.state
+        image_data = {'timestamp': self.timestamp,
+                      'datetime': self.datetime(),
+                      'exposure': state.exposure,
+                      'detector': {'model': self.model},
+                      'chip_temp': state.chip_temp,
+                      'hous_temp': state.hous_temp}
+        if self.seed is not None:
+            image_data['seed'] = self.seed
+        if self.cached:
+            image_data['cached'] = True
+        if self.encoding is not None:
+            image_data['encoding'] = self.encoding
+
+        frame_metadata = {'image_data': image_data,
+                          'object': {'present': state.object_present,
+                                     'angle position': state.angle_position,
+                                     'horizontal position': state.x_position,
+                                     # 'vertical position': state.y_position
+                                     },
+                          'shutter': {'open': state.shutter_status == 'OPEN'},
+                          'X-ray source': {'voltage': state.source_voltage,
+                                           'current': state.source_current}}
+        if self.mode is not None:
+            frame_metadata['mode'] = self.mode
+        if self.number is not None:
+            frame_metadata['number'] = self.number
+        return frame_metadata
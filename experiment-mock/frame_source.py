@@ -0,0 +1,129 @@
+import atexit
+import threading
+import zlib
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+def frame_rng(seed, frame_num):
+    # random state of one frame of replayed experiment, doesn't depend on frames taken before
+    return np.random.RandomState([seed, frame_num])
+
+
+def conditions_rng(seed, conditions):
+    # random state of cached frame, it depends on conditions of frame instead of its number
+    digest = zlib.crc32(repr(sorted(conditions.items())).encode())
+    return np.random.RandomState([seed, digest])
+
+
+class FrameBufferPool:
+    # preallocated frame buffers, released buffers are reused instead of allocating new ones;
+    # shared buffers are in shared memory blocks, so other processes can read frames without copying
+    def __init__(self, shape, dtype, buffers_count, shared=False):
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.buffers_count = buffers_count
+        self.blocks = []
+        # every shared buffer with name of its block; buffers are kept here while they are in use too, so they are
+        # found by identity: id of leaked buffer could be taken by another array
+        self.shared_buffers = []
+        if shared and shared_memory is not None:
+            self.free_buffers = [self.shared_buffer() for i in range(buffers_count)]
+            atexit.register(self.unlink)
+        else:
+            self.free_buffers = [np.empty(shape, dtype=self.dtype) for i in range(buffers_count)]
+        self.lock = threading.Lock()
+
+    def shared_buffer(self):
+        size = int(np.prod(self.shape)) * self.dtype.itemsize
+        block = shared_memory.SharedMemory(create=True, size=size)
+        buffer = np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+        self.blocks.append(block)
+        self.shared_buffers.append((buffer, block.name))
+        return buffer
+
+    def block_name(self, buffer):
+        # None for buffers not in shared memory
+        for shared_buffer, name in self.shared_buffers:
+            if shared_buffer is buffer:
+                return name
+        return None
+
+    def unlink(self):
+        for block in self.blocks:
+            try:
+                block.unlink()
+            except OSError:
+                pass
+
+    def acquire(self):
+        with self.lock:
+            if self.free_buffers:
+                return self.free_buffers.pop()
+        # all buffers are in use, allocate one more (it will be dropped on release if pool is full)
+        return np.empty(self.shape, dtype=self.dtype)
+
+    def release(self, buffer):
+        # read-only frames are cached ones, they are not given out as buffers
+        if buffer is None or buffer.shape != self.shape or buffer.dtype != self.dtype or not buffer.flags.writeable:
+            return
+        # buffers allocated over shared ones are dropped, so pool always keeps all shared buffers
+        if self.shared_buffers and self.block_name(buffer) is None:
+            return
+        with self.lock:
+            if len(self.free_buffers) < self.buffers_count:
+                self.free_buffers.append(buffer)
+
+
+class FrameSource:
+    # synthetic detector frames rendered to pooled buffers: projections by simulator if it is given,
+    # otherwise random window of precomputed noise tile
+    def __init__(self, height, width, dtype, buffers_count, simulator=None, seed=None, shared=False):
+        self.height = height
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.max_value = np.iinfo(self.dtype).max
+        self.pool = FrameBufferPool((height, width), self.dtype, buffers_count, shared=shared)
+        self.simulator = simulator
+        self.noise = None
+        self.rng = np.random.RandomState()
+        if simulator is not None:
+            return
+
+        # one extra frame of noise, so each frame starts at random offset inside the tile
+        noise_size = 2 * height * width
+        if hasattr(np.random, 'default_rng'):
+            rng = np.random.default_rng(seed)
+            self.noise = rng.integers(0, self.max_value, noise_size, dtype=self.dtype, endpoint=True)
+        else:
+            rng = np.random.RandomState(seed)
+            self.noise = rng.randint(0, self.max_value + 1, noise_size).astype(self.dtype)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    def get_frame(self, rng=None, **conditions):
+        # rng of replayed frame makes it the same in every run
+        frame = self.pool.acquire()
+        if self.simulator is not None:
+            return self.simulator.render(frame, rng=rng, **conditions)
+
+        if rng is None:
+            rng = self.rng
+        size = self.height * self.width
+        offset = rng.randint(0, size + 1)
+        np.copyto(frame.reshape(-1), self.noise[offset:offset + size])
+        # random brightness level like the real detector under different conditions
+        np.right_shift(frame, rng.randint(0, self.dtype.itemsize * 8), out=frame)
+        return frame
+
+    def release(self, frame):
+        self.pool.release(frame)
+
+    def block_name(self, frame):
+        return self.pool.block_name(frame)
@@ -0,0 +1,246 @@
+import json
+import mmap
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from .frame_codecs import BuffersStream
+
+RING_FILE = 'frames.ring'
+INDEX_FILE = 'index.jsonl'
+DRAINED_FILE = 'drained'
+REJECTED_DIR = 'rejected'
+REJECTED_INDEX_FILE = 'rejected.jsonl'
+
+# request to storage kept in spool: its file is in ring from position, form data and the rest are in index;
+# position only grows, file is at position % capacity of ring
+SpoolEntry = namedtuple('SpoolEntry', ('seq', 'position', 'size', 'uri', 'data', 'file_name', 'time'))
+
+
+class SpoolFullError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return repr(self.message)
+
+
+class FrameSpool:
+    # requests to storage are appended to memory-mapped ring file and index, drainer thread sends them
+    # in the same order and waits while storage is down; requests left in directory are sent after restart;
+    # requests failed with rejected_errors are not sent again, they are moved to rejected directory
+    def __init__(self, directory, max_bytes, send, full_timeout, retry_backoff, max_backoff, rejected_errors=()):
+        self.directory = directory
+        self.send = send
+        self.rejected_errors = rejected_errors
+        self.full_timeout = full_timeout
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        os.makedirs(directory, exist_ok=True)
+
+        self.condition = threading.Condition()
+        # appends are serialized, file of request is copied to ring without holding condition
+        self.write_lock = threading.Lock()
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.drained_seq = self.read_drained_seq()
+        self.load_index()
+        self.next_seq = (self.pending[-1].seq if self.pending else self.drained_seq) + 1
+        self.tail = self.pending[-1].position + self.pending[-1].size if self.pending else 0
+
+        ring_path = os.path.join(directory, RING_FILE)
+        with open(ring_path, 'a+b') as f:
+            # ring of spool with pending requests keeps its size, new ring file is sparse
+            if not self.pending or os.path.getsize(ring_path) == 0:
+                f.truncate(max_bytes)
+            self.capacity = os.path.getsize(ring_path)
+            self.ring = mmap.mmap(f.fileno(), self.capacity)
+        self.index_file = open(os.path.join(directory, INDEX_FILE), 'a', encoding='utf-8')
+
+        self.spooled_count = 0
+        self.drained_count = 0
+        self.errors_count = 0
+        self.last_error = None
+        self.rejected_count = 0
+        self.last_rejected = None
+        self.storage_available = None
+
+        self.drainer = threading.Thread(target=self.drain, name='spool-drainer-{}'.format(directory), daemon=True)
+        self.drainer.start()
+
+    def read_drained_seq(self):
+        try:
+            with open(os.path.join(self.directory, DRAINED_FILE)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+
+        for line in lines:
+            try:
+                entry = SpoolEntry(**json.loads(line))
+            except (ValueError, TypeError):
+                # the last line could be written partially when process was killed
+                continue
+            if entry.seq > self.drained_seq:
+                self.pending.append(entry)
+                self.pending_bytes += entry.size
+
+    def find_position(self, size):
+        # place for file after the last pending one, None while ring has no room for it;
+        # pending files are between positions of head and tail, so they take tail - head bytes at most
+        position = self.tail
+        if position % self.capacity + size > self.capacity:
+            # file isn't split by end of ring, it starts from the beginning
+            position += self.capacity - position % self.capacity
+        head = self.pending[0].position if self.pending else position
+        return position if position + size - head <= self.capacity else None
+
+    def append(self, uri, data, file_name=None, frame_file=None):
+        # waits up to full_timeout while drainer frees room in ring
+        size = 0
+        if frame_file is not None:
+            size = frame_file.seek(0, os.SEEK_END)
+            frame_file.seek(0)
+        if size > self.capacity:
+            raise SpoolFullError('Request of {} bytes is bigger than spool'.format(size))
+
+        with self.write_lock:
+            with self.condition:
+                if not self.condition.wait_for(lambda: self.find_position(size) is not None, self.full_timeout):
+                    raise SpoolFullError('Spool is full for {} s, storage is too slow or down'.format(
+                        self.full_timeout))
+                position = self.find_position(size)
+
+            # room between tail and head is not read by drainer
+            offset = position % self.capacity
+            view = memoryview(self.ring)[offset:offset + size]
+            try:
+                written = 0
+                while written < size:
+                    count = frame_file.readinto(view[written:])
+                    if not count:
+                        raise SpoolFullError('File of request is shorter than its size')
+                    written += count
+            finally:
+                view.release()
+
+            with self.condition:
+                entry = SpoolEntry(seq=self.next_seq, position=position, size=size, uri=uri, data=data,
+                                   file_name=file_name, time=time.time())
+                self.index_file.write(json.dumps(entry._asdict()) + '\n')
+                self.index_file.flush()
+                self.next_seq += 1
+                self.tail = position + size
+                self.pending.append(entry)
+                self.pending_bytes += size
+                self.spooled_count += 1
+                self.condition.notify_all()
+        return entry.seq
+
+    def drain(self):
+        backoff = self.retry_backoff
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                entry = self.pending[0]
+
+            frame_file = None
+            if entry.file_name is not None:
+                offset = entry.position % self.capacity
+                frame_file = BuffersStream([self.ring[offset:offset + entry.size]])
+            try:
+                self.send(entry.uri, entry.data, entry.file_name, frame_file)
+            except self.rejected_errors as e:
+                # storage is available, but will never accept this request, so it doesn't hold requests after it
+                self.reject(entry, e)
+            except Exception as e:
+                with self.condition:
+                    self.errors_count += 1
+                    self.last_error = str(e)
+                    self.storage_available = False
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            else:
+                with self.condition:
+                    self.drained_count += 1
+            backoff = self.retry_backoff
+
+            with self.condition:
+                self.pending.popleft()
+                self.pending_bytes -= entry.size
+                self.drained_seq = entry.seq
+                self.storage_available = True
+                self.write_drained_seq()
+                if not self.pending:
+                    # everything is sent, index starts again
+                    self.index_file.seek(0)
+                    self.index_file.truncate()
+                self.condition.notify_all()
+
+    def reject(self, entry, error):
+        # file of request is copied from ring, index line of request gets the error
+        rejected = entry._asdict()
+        rejected['error'] = str(error)
+        try:
+            if entry.file_name is not None:
+                rejected_dir = os.path.join(self.directory, REJECTED_DIR)
+                os.makedirs(rejected_dir, exist_ok=True)
+                rejected['path'] = os.path.join(rejected_dir, '{}-{}'.format(entry.seq, entry.file_name))
+                offset = entry.position % self.capacity
+                with open(rejected['path'], 'wb') as f:
+                    f.write(self.ring[offset:offset + entry.size])
+            with open(os.path.join(self.directory, REJECTED_INDEX_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(rejected) + '\n')
+        except OSError as e:
+            rejected['error'] += '; could not be saved: {}'.format(e)
+
+        print('Spool {}: request {} to {} is rejected by storage: {}'.format(self.directory, entry.seq, entry.uri,
+                                                                               error))
+        with self.condition:
+            self.rejected_count += 1
+            self.last_rejected = rejected
+
+    def write_drained_seq(self):
+        path = os.path.join(self.directory, DRAINED_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(self.drained_seq))
+        os.replace(path + '.tmp', path)
+
+    def wait_drained(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending, timeout)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'directory': self.directory,
+                'capacity': self.capacity,
+                'pending': len(self.pending),
+                'pending bytes': self.pending_bytes,
+                'oldest pending age': time.time() - self.pending[0].time if self.pending else None,
+                'spooled': self.spooled_count,
+                'drained': self.drained_count,
+                'last drained seq': self.drained_seq,
+                'errors': self.errors_count,
+                'last error': self.last_error,
+                'rejected': self.rejected_count,
+                'last rejected': self.last_rejected,
+                'storage available': self.storage_available,
+            }
+
+
+def spool_has_pending(directory):
+    # index is emptied when all its requests are sent
+    try:
+        return os.path.getsize(os.path.join(directory, INDEX_FILE)) > 0
+    except OSError:
+        return False
@@ -0,0 +1,89 @@
+import threading
+import queue
+
+
+class FrameSequencer:
+    # keeps frames of one experiment in order: frame N is sent only after frames 0..N-1 are sent or dropped
+    def __init__(self):
+        self.next_frame = 0
+        self.released = set()
+        self.condition = threading.Condition()
+
+    def wait_turn(self, frame_seq):
+        with self.condition:
+            self.condition.wait_for(lambda: self.next_frame == frame_seq)
+
+    def release(self, frame_seq):
+        with self.condition:
+            self.released.add(frame_seq)
+            while self.next_frame in self.released:
+                self.released.remove(self.next_frame)
+                self.next_frame += 1
+            self.condition.notify_all()
+
+    def wait_all(self, frames_count):
+        with self.condition:
+            self.condition.wait_for(lambda: self.next_frame >= frames_count)
+
+
+class FrameUploader:
+    # fixed pool of workers with bounded queue, submit() blocks when queue is full;
+    # discard is called for frames dropped without sending; workers are started by the first frame
+    def __init__(self, target, workers_count, queue_size, name='frame-uploader', discard=None):
+        self.target = target
+        self.discard = discard
+        self.workers_count = workers_count
+        self.name = name
+        self.tasks = queue.Queue(maxsize=queue_size)
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            for i in range(len(self.workers), self.workers_count):
+                thr = threading.Thread(target=self._work, name='{}-{}'.format(self.name, i), daemon=True)
+                thr.start()
+                self.workers.append(thr)
+
+    def submit(self, experiment, frame, send_to_webpage, frame_seq):
+        if not self.workers:
+            self.start()
+        self.tasks.put((experiment, frame, send_to_webpage, frame_seq))
+
+    def queue_depth(self):
+        return self.tasks.qsize()
+
+    def cancel(self):
+        # drop all queued frames, so stopped experiment doesn't wait for them and acquisition is unblocked
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                return
+            self._drop(task)
+
+    def _drop(self, task):
+        experiment, frame, send_to_webpage, frame_seq = task
+        try:
+            if self.discard is not None:
+                self.discard(frame, experiment)
+        finally:
+            experiment.upload_sequencer.release(frame_seq)
+            self.tasks.task_done()
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            experiment, frame, send_to_webpage, frame_seq = task
+            # after a failure or stop the rest of experiment's frames are just dropped
+            if experiment.to_be_stopped:
+                self._drop(task)
+                continue
+
+            try:
+                self.target(frame, experiment, send_to_webpage, frame_seq)
+            except Exception as e:
+                print('Frame uploader: unexpected error: {}'.format(e))
+            finally:
+                experiment.upload_sequencer.release(frame_seq)
+                self.tasks.task_done()
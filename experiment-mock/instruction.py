@@ -0,0 +1,180 @@
+import ast
+import operator
+
+# instruction of advanced experiment is small python subset: assignments, arithmetic, if, for loops over
+# range or lists and calls of functions below; it is checked and compiled once before experiment start
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.For, ast.If, ast.Pass, ast.Break, ast.Continue,
+    ast.Name, ast.Load, ast.Store, ast.Constant, ast.List, ast.Tuple, ast.Call, ast.keyword,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.UnaryOp, ast.UAdd, ast.USub, ast.Not,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+TOMOGRAPH_FUNCTIONS = (
+    'source_power_on', 'source_power_off', 'set_voltage', 'set_current', 'get_voltage', 'get_current',
+    'open_shutter', 'close_shutter', 'set_x', 'set_y', 'set_angle', 'get_x', 'get_y', 'get_angle',
+    'reset_angle', 'move_away', 'move_back', 'set_exposure', 'get_exposure',
+    'get_frame', 'get_frames', 'wait',
+)
+BUILTIN_FUNCTIONS = ('range', 'abs', 'min', 'max', 'round', 'int', 'float')
+FRAME_MODES = ('dark', 'empty', 'data')
+
+MAX_LOOP_LENGTH = 100000
+# all iterations of all loops of one instruction
+MAX_LOOP_ITERATIONS = 1000000
+MAX_SEQUENCE_LENGTH = 100000
+MAX_INT_BITS = 1024
+
+# names of functions which compiled instruction calls for loops and arithmetic, names of instruction can't
+# start with "_", so they can't be replaced
+LOOP_FUNCTION = '_loop'
+BINARY_OP_FUNCTION = '_binary_op'
+OPERATORS = {
+    'Add': operator.add, 'Sub': operator.sub, 'Mult': operator.mul,
+    'Div': operator.truediv, 'FloorDiv': operator.floordiv, 'Mod': operator.mod,
+}
+
+
+class InstructionError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return repr(self.message)
+
+
+def compile_instruction(instruction):
+    try:
+        tree = ast.parse(instruction, mode='exec')
+    except SyntaxError as e:
+        raise InstructionError('Syntax error in instruction, line {}: {}'.format(e.lineno, e.msg))
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise InstructionError('Unacceptable instruction: {} is not allowed (line {})'
+                                   .format(type(node).__name__, getattr(node, 'lineno', '?')))
+        if isinstance(node, ast.Name):
+            if node.id.startswith('_'):
+                raise InstructionError('Unacceptable instruction: names must not start with "_"')
+            if isinstance(node.ctx, ast.Store) and node.id in TOMOGRAPH_FUNCTIONS + BUILTIN_FUNCTIONS:
+                raise InstructionError('Unacceptable instruction: "{}" can not be assigned'.format(node.id))
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and node.func.id in TOMOGRAPH_FUNCTIONS + BUILTIN_FUNCTIONS):
+                raise InstructionError('Unacceptable instruction: only functions {} can be called'
+                                       .format(', '.join(TOMOGRAPH_FUNCTIONS + BUILTIN_FUNCTIONS)))
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str, bool, type(None))):
+            raise InstructionError('Unacceptable instruction: constant {!r} is not allowed'.format(node.value))
+
+    tree = ast.fix_missing_locations(LimitedInstruction().visit(tree))
+    return compile(tree, '<instruction>', 'exec')
+
+
+class LimitedInstruction(ast.NodeTransformer):
+    # loops and arithmetic go through functions of namespace: loops are stopped with experiment and
+    # have one budget of iterations, results of arithmetic can't take much memory
+    def visit_For(self, node):
+        self.generic_visit(node)
+        node.iter = ast.copy_location(call_function(LOOP_FUNCTION, [node.iter]), node.iter)
+        return node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        args = [ast.Constant(type(node.op).__name__), node.left, node.right]
+        return ast.copy_location(call_function(BINARY_OP_FUNCTION, args), node)
+
+    def visit_AugAssign(self, node):
+        # target is always name, other targets aren't allowed
+        self.generic_visit(node)
+        args = [ast.Constant(type(node.op).__name__), ast.Name(id=node.target.id, ctx=ast.Load()), node.value]
+        return ast.copy_location(ast.Assign(targets=[node.target], value=call_function(BINARY_OP_FUNCTION, args)),
+                                 node)
+
+
+def call_function(name, args):
+    return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+
+
+def limited_range(*args):
+    values = range(*args)
+    if len(values) > MAX_LOOP_LENGTH:
+        raise InstructionError('Loop is too long, maximum is {} steps'.format(MAX_LOOP_LENGTH))
+    return values
+
+
+def binary_op(op_name, left, right):
+    # size of result is checked before it is computed
+    if op_name == 'Mult' and not (isinstance(left, (int, float)) and isinstance(right, (int, float))):
+        raise InstructionError('Only numbers can be multiplied')
+    if isinstance(left, int) and isinstance(right, int):
+        # product has at most bits of both operands, sum and difference one bit more than the bigger operand
+        if op_name == 'Mult':
+            bits = left.bit_length() + right.bit_length()
+        elif op_name in ('Add', 'Sub'):
+            bits = max(left.bit_length(), right.bit_length()) + 1
+        else:
+            bits = 0
+        if bits > MAX_INT_BITS:
+            raise InstructionError('Integer is too big, maximum is {} bits'.format(MAX_INT_BITS))
+    if op_name == 'Add' and isinstance(left, (str, list, tuple)) and isinstance(right, (str, list, tuple)):
+        if len(left) + len(right) > MAX_SEQUENCE_LENGTH:
+            raise InstructionError('Sequence is too long, maximum is {} items'.format(MAX_SEQUENCE_LENGTH))
+    return OPERATORS[op_name](left, right)
+
+
+def instruction_namespace(experiment):
+    tomograph = experiment.tomograph
+
+    def get_frame(mode='data', exposure=None):
+        if mode not in FRAME_MODES:
+            raise InstructionError('Frame mode must be one of: ' + ', '.join(FRAME_MODES))
+        experiment.get_and_send_frame(exposure=exposure, mode=mode)
+
+    def get_frames(count, mode='data', exposure=None):
+        for i in limited_range(count):
+            get_frame(mode=mode, exposure=exposure)
+
+    iterations = 0
+
+    def loop(values):
+        # every iteration of instruction loops checks stop, so stop doesn't wait for loops without tomograph calls
+        nonlocal iterations
+        for value in values:
+            if experiment.to_be_stopped:
+                raise experiment.stop_exception
+            iterations += 1
+            if iterations > MAX_LOOP_ITERATIONS:
+                raise InstructionError('Loops are too long, maximum is {} iterations'.format(MAX_LOOP_ITERATIONS))
+            yield value
+
+    functions = {
+        'source_power_on': lambda: tomograph.source_power_on(from_experiment=True),
+        'source_power_off': lambda: tomograph.source_power_off(from_experiment=True),
+        'set_voltage': lambda voltage: tomograph.source_set_voltage(float(voltage), from_experiment=True),
+        'set_current': lambda current: tomograph.source_set_current(float(current), from_experiment=True),
+        'get_voltage': lambda: tomograph.source_get_voltage(from_experiment=True),
+        'get_current': lambda: tomograph.source_get_current(from_experiment=True),
+        'open_shutter': lambda: tomograph.open_shutter(0, from_experiment=True),
+        'close_shutter': lambda: tomograph.close_shutter(0, from_experiment=True),
+        'set_x': lambda x: tomograph.set_x(x, from_experiment=True),
+        'set_y': lambda y: tomograph.set_y(y, from_experiment=True),
+        'set_angle': lambda angle: tomograph.set_angle(angle, from_experiment=True),
+        'get_x': lambda: tomograph.get_x(from_experiment=True),
+        'get_y': lambda: tomograph.get_y(from_experiment=True),
+        'get_angle': lambda: tomograph.get_angle(from_experiment=True),
+        'reset_angle': lambda: tomograph.reset_to_zero_angle(from_experiment=True),
+        'move_away': lambda: tomograph.move_away(from_experiment=True),
+        'move_back': lambda: tomograph.move_back(from_experiment=True),
+        'set_exposure': lambda exposure: tomograph.set_exposure(exposure, from_experiment=True),
+        'get_exposure': lambda: tomograph.get_exposure(from_experiment=True),
+        'get_frame': get_frame,
+        'get_frames': get_frames,
+        'wait': lambda seconds: tomograph.wait(seconds, from_experiment=True),
+        'range': limited_range,
+        'abs': abs, 'min': min, 'max': max, 'round': round, 'int': int, 'float': float,
+    }
+    functions[LOOP_FUNCTION] = loop
+    functions[BINARY_OP_FUNCTION] = binary_op
+    functions['__builtins__'] = {}
+    return functions
@@ -0,0 +1,99 @@
+import struct
+import threading
+import time
+
+from .experiment import ModExpError, make_png
+
+LIVE_VIEW_BOUNDARY = 'frame'
+RAW_FRAME_HEADER = struct.Struct('<4sIII')  # b'RBTM', height, width, frame number; then uint16 pixels
+
+
+class LiveView:
+    # one acquisition loop per tomograph shared by all viewers, every viewer gets only the latest frame,
+    # so slow viewers skip frames instead of buffering them
+    def __init__(self, tomograph, wait_timeout=5.0):
+        self.tomograph = tomograph
+        self.wait_timeout = wait_timeout
+        self.condition = threading.Condition()
+        self.subscribers = {'png': 0, 'raw': 0}
+        self.frames = {}
+        self.frame_num = 0
+        self.exposure = None
+        self.rate = None
+        self.error = None
+        self.thread = None
+
+    def stream(self, exposure, rate, frame_format):
+        with self.condition:
+            self.subscribers[frame_format] += 1
+            # the last viewer sets exposure and rate for everyone
+            self.exposure = exposure
+            self.rate = rate
+            if self.thread is None:
+                self.error = None
+                self.thread = threading.Thread(target=self.produce, daemon=True,
+                                               name='tomograph-{}-live-view'.format(self.tomograph.tomo_num))
+                self.thread.start()
+            last_frame_num = self.frame_num
+
+        # exposure is in milliseconds
+        timeout = self.wait_timeout + exposure / 1000.0 + 1.0 / rate
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.frame_num != last_frame_num or self.error is not None,
+                                            timeout=timeout)
+                    if self.error is not None or self.frame_num == last_frame_num:
+                        return
+                    last_frame_num = self.frame_num
+                    frame = self.frames.get(frame_format)
+                if frame is not None:
+                    yield frame
+        finally:
+            with self.condition:
+                self.subscribers[frame_format] -= 1
+
+    def produce(self):
+        while True:
+            with self.condition:
+                formats = [f for f, count in self.subscribers.items() if count > 0]
+                if not formats:
+                    self.thread = None
+                    return
+                exposure = self.exposure
+                rate = self.rate
+
+            start = time.time()
+            try:
+                # changes of shutter and exposure don't come between steps of batch, exposure doesn't hold them
+                frame = self.tomograph.get_frame(exposure=exposure, with_open_shutter=True,
+                                                 state_lock=self.tomograph.lock)
+            except ModExpError as e:
+                with self.condition:
+                    self.error = e
+                    self.thread = None
+                    self.condition.notify_all()
+                return
+
+            raw_image = frame.raw_image
+            try:
+                frames = {frame_format: self.encode(raw_image, frame_format) for frame_format in formats}
+            finally:
+                self.tomograph.frame_source.release(raw_image)
+
+            with self.condition:
+                self.frames = frames
+                self.frame_num += 1
+                self.condition.notify_all()
+
+            time.sleep(max(0.0, 1.0 / rate - (time.time() - start)))
+
+    def encode(self, raw_image, frame_format):
+        if frame_format == 'png':
+            png = make_png(raw_image)
+            return b''.join((('--{}\r\nContent-Type: image/png\r\nContent-Length: {}\r\n\r\n'
+                              .format(LIVE_VIEW_BOUNDARY, len(png))).encode(), png, b'\r\n'))
+
+        height, width = raw_image.shape
+        header = RAW_FRAME_HEADER.pack(b'RBTM', height, width, self.frame_num + 1)
+        return header + raw_image.astype('<u2', copy=False).tobytes()
@@ -0,0 +1,152 @@
+import threading
+import time
+from bisect import bisect_left
+
+from .constants import METRICS_ENABLED
+
+# all metrics do nothing when disabled, then hot path pays only for one check of this flag
+enabled = METRICS_ENABLED
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = []
+
+
+def clock():
+    # start time for observe_since, None when metrics are disabled
+    return time.perf_counter() if enabled else None
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def labels_text(self, label_values, extra=()):
+        pairs = list(zip(self.label_names, label_values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, escape(value)) for name, value in pairs) + '}'
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} {}'.format(self.name, self.type)]
+        with self.lock:
+            values = sorted(self.values.items(), key=lambda item: [str(v) for v in item[0]])
+            lines += self.render_values(values)
+        return lines
+
+    def render_values(self, values):
+        return ['{}{} {}'.format(self.name, self.labels_text(label_values), format_value(value))
+                for label_values, value in values]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, *label_values):
+        if not enabled:
+            return
+        with self.lock:
+            self.values[label_values] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        if not enabled:
+            return
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                # counts of buckets (last one is +Inf), sum and count
+                counts = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def observe_since(self, start, *label_values):
+        if start is None or not enabled:
+            return
+        self.observe(time.perf_counter() - start, *label_values)
+
+    def render_values(self, values):
+        lines = []
+        for label_values, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = (('le', '+Inf' if bound == float('inf') else format_value(bound)),)
+                lines.append('{}_bucket{} {}'.format(self.name, self.labels_text(label_values, le), cumulative))
+            labels = self.labels_text(label_values)
+            lines.append('{}_sum{} {}'.format(self.name, labels, format_value(counts[-2])))
+            lines.append('{}_count{} {}'.format(self.name, labels, counts[-1]))
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if type(value) is bool:
+        return '1' if value else '0'
+    return repr(float(value)) if type(value) is float else str(value)
+
+
+def render():
+    # text exposition format of Prometheus
+    lines = []
+    for metric in registry:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+FRAMES_GENERATED = Counter('mock_frames_generated_total', 'Frames taken by detector', ('tomograph',))
+FRAME_GENERATE_SECONDS = Histogram('mock_frame_generate_seconds', 'Time of rendering frame', ('tomograph',))
+FRAMES_SENT = Counter('mock_frames_sent_total', 'Frames of experiments sent to storage', ('tomograph',))
+FRAMES_FAILED = Counter('mock_frames_failed_total', 'Frames of experiments not sent because of errors',
+                        ('tomograph',))
+FRAMES_DISCARDED = Counter('mock_frames_discarded_total', 'Queued frames dropped after experiment stop',
+                           ('tomograph',))
+FRAME_ENCODE_SECONDS = Histogram('mock_frame_encode_seconds', 'Time of frame encoding', ('encoding',))
+PREPARE_SEND_FRAME_SECONDS = Histogram('mock_prepare_send_frame_seconds',
+                                       'Time of encoding and sending frame by upload worker', ('tomograph',))
+UPLOAD_SUBMIT_WAIT_SECONDS = Histogram('mock_upload_submit_wait_seconds',
+                                       'Time acquisition waits for place in full upload queue', ('tomograph',))
+ACQUISITION_GAP_SECONDS = Histogram('mock_acquisition_gap_seconds',
+                                    'Time between frames of experiment spent outside of frame acquisition',
+                                    ('tomograph',))
+STORAGE_REQUEST_SECONDS = Histogram('mock_storage_request_seconds', 'Time of storage requests', ('endpoint',))
+STORAGE_RETRIES = Counter('mock_storage_retries_total', 'Repeated storage requests', ('endpoint',))
+STORAGE_ERRORS = Counter('mock_storage_errors_total', 'Storage requests failed after all attempts', ('endpoint',))
+UPLOAD_QUEUE_DEPTH = Gauge('mock_upload_queue_depth', 'Frames waiting in upload queue', ('tomograph',))
+EXPERIMENT_RUNNING = Gauge('mock_experiment_running', 'Experiment is running on tomograph', ('tomograph',))
+FRAME_CACHE_BYTES = Gauge('mock_frame_cache_bytes', 'Size of frame cache', ('tomograph',))
+FRAME_CACHE_HITS = Gauge('mock_frame_cache_hits', 'Frames taken from frame cache', ('tomograph',))
+FRAME_CACHE_MISSES = Gauge('mock_frame_cache_misses', 'Frames rendered for frame cache', ('tomograph',))
+SPOOL_PENDING_REQUESTS = Gauge('mock_spool_pending_requests', 'Requests waiting in spool for storage', ('tomograph',))
+SPOOL_PENDING_BYTES = Gauge('mock_spool_pending_bytes', 'Size of files waiting in spool', ('tomograph',))
+SPOOL_DRAINED = Gauge('mock_spool_drained', 'Requests sent from spool to storage', ('tomograph',))
+SPOOL_REJECTED = Gauge('mock_spool_rejected', 'Requests from spool rejected by storage and moved aside',
+                       ('tomograph',))
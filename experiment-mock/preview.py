@@ -0,0 +1,54 @@
+import struct
+import zlib
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def downsample(image_numpy, rows_factor, cols_factor):
+    # mean of rows_factor x cols_factor blocks, incomplete blocks at the edges are dropped
+    rows = image_numpy.shape[0] // rows_factor
+    cols = image_numpy.shape[1] // cols_factor
+    if rows_factor == 1 and cols_factor == 1:
+        return image_numpy.astype(np.float32)
+    blocks = image_numpy[:rows * rows_factor, :cols * cols_factor].reshape(rows, rows_factor, cols, cols_factor)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+def to_uint8(image, low=None, high=None):
+    low = float(image.min()) if low is None else float(low)
+    high = float(image.max()) if high is None else float(high)
+    scale = 255.0 / (high - low) if high > low else 0.0
+
+    image = image - np.float32(low)
+    image *= np.float32(scale)
+    np.clip(image, 0, 255, out=image)
+    return image.astype(np.uint8)
+
+
+def png_chunk(chunk_type, data):
+    chunk = chunk_type + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+
+
+def encode_png(image_uint8, compress_level=6):
+    # 8-bit grayscale PNG, every row with filter type 0 (None)
+    height, width = image_uint8.shape
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = image_uint8
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return b''.join((PNG_SIGNATURE,
+                     png_chunk(b'IHDR', header),
+                     png_chunk(b'IDAT', zlib.compress(rows.tobytes(), compress_level)),
+                     png_chunk(b'IEND', b'')))
+
+
+def render_png(image_numpy, width=None, height=None, low=None, high=None, default_factor=4):
+    # image is shown rotated by 90 degrees, so preview width is made of detector rows
+    rows, cols = image_numpy.shape
+    rows_factor = -(-rows // width) if width else default_factor
+    cols_factor = -(-cols // height) if height else default_factor
+
+    small = downsample(image_numpy, max(rows_factor, 1), max(cols_factor, 1))
+    return encode_png(np.rot90(to_uint8(small, low, high)))
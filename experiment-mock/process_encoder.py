@@ -0,0 +1,75 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from .frame_codecs import get_codec
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# shared memory blocks attached by encoding process, they are reused for all frames
+attached_blocks = {}
+
+
+def attach_block(name):
+    block = attached_blocks.get(name)
+    if block is None:
+        try:
+            # block belongs to main process, encoding process must not unlink it on exit
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            block = shared_memory.SharedMemory(name=name)
+        attached_blocks[name] = block
+    return block
+
+
+def encode_shared_frame(codec_name, block_name, shape, dtype):
+    image_numpy = np.ndarray(shape, dtype=dtype, buffer=attach_block(block_name).buf)
+    return get_codec(codec_name).encode(image_numpy).read()
+
+
+class ProcessEncoder:
+    # encodes frames in pooled shared memory by pool of processes, so compression isn't limited by GIL;
+    # processes get only name of memory block and return encoded bytes
+    def __init__(self, processes):
+        self.processes = processes
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.processes > 0 and shared_memory is not None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # spawn: fork of process with running threads may copy locks held by them
+                self.executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def encode(self, codec, image_numpy, block_name=None):
+        # frames not in shared memory and codecs without compression are encoded by calling thread
+        if not self.enabled or block_name is None or not codec.compressed:
+            return codec.encode(image_numpy)
+
+        executor = self.get_executor()
+        try:
+            future = executor.submit(encode_shared_frame, codec.name, block_name, image_numpy.shape,
+                                     image_numpy.dtype.str)
+            return io.BytesIO(future.result())
+        except BrokenProcessPool:
+            # a process died, pool is created again for next frames and this one is encoded here
+            self.shutdown(executor)
+            return codec.encode(image_numpy)
+
+    def shutdown(self, executor=None):
+        with self.lock:
+            if self.executor is not None and executor in (None, self.executor):
+                self.executor.shutdown(wait=False)
+                self.executor = None
@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+
+from .fast_json import dumps
+
+HEARTBEAT_MESSAGE = b': heartbeat\n\n'
+
+# events of every frame are coalesced: slow watchers skip them, the other events are sent to every watcher
+COALESCED_EVENT_TYPES = ('progress',)
+
+
+class ProgressBroadcaster:
+    # progress events of tomograph for all watchers (server-sent events): producer serializes each event once;
+    # start, phase and finish events of the latest experiment are kept in one log and every watcher is sent
+    # all of them, of progress events only the latest one is kept, like frames for viewers of live view
+    def __init__(self, heartbeat, max_events):
+        self.heartbeat = heartbeat
+        self.condition = threading.Condition()
+        self.subscribers = 0
+        self.event_num = 0
+        self.events = deque(maxlen=max_events)
+        self.progress = None
+
+    def publish(self, event_type, event):
+        data = dumps(event)
+        with self.condition:
+            self.event_num += 1
+            message = 'id: {}\nevent: {}\ndata: {}\n\n'.format(self.event_num, event_type, data).encode()
+            if event_type in COALESCED_EVENT_TYPES:
+                self.progress = (self.event_num, message)
+            else:
+                if event_type == 'start':
+                    # new watchers get events of this experiment only
+                    self.events.clear()
+                    self.progress = None
+                self.events.append((self.event_num, message))
+            self.condition.notify_all()
+
+    def new_messages(self, last_event_num):
+        # events after last_event_num in order of their numbers
+        messages = [(num, message) for num, message in self.events if num > last_event_num]
+        if self.progress is not None and self.progress[0] > last_event_num:
+            messages.append(self.progress)
+            messages.sort()
+        return messages
+
+    def stream(self):
+        # events of the latest experiment are sent at once, so watcher knows what tomograph is doing without
+        # waiting; heartbeat keeps connection alive and lets server notice closed ones
+        with self.condition:
+            self.subscribers += 1
+        last_event_num = 0
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.event_num != last_event_num, timeout=self.heartbeat)
+                    messages = self.new_messages(last_event_num)
+                    last_event_num = self.event_num
+                if not messages:
+                    yield HEARTBEAT_MESSAGE
+                for num, message in messages:
+                    yield message
+        finally:
+            with self.condition:
+                self.subscribers -= 1
@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# modified 3D Shepp-Logan phantom: (A, a, b, c, x0, y0, z0, phi),
+# phi is rotation around vertical axis in degrees (other rotations of original phantom are omitted)
+SHEPP_LOGAN_ELLIPSOIDS = (
+    (1.0, 0.6900, 0.920, 0.810, 0.00, 0.0000, 0.00, 0),
+    (-0.8, 0.6624, 0.874, 0.780, 0.00, -0.0184, 0.00, 0),
+    (-0.2, 0.1100, 0.310, 0.220, 0.22, 0.0000, 0.00, -18),
+    (-0.2, 0.1600, 0.410, 0.280, -0.22, 0.0000, 0.00, 18),
+    (0.1, 0.2100, 0.250, 0.410, 0.00, 0.3500, -0.15, 0),
+    (0.1, 0.0460, 0.046, 0.050, 0.00, 0.1000, 0.25, 0),
+    (0.1, 0.0460, 0.046, 0.050, 0.00, -0.1000, 0.25, 0),
+    (0.1, 0.0460, 0.023, 0.050, -0.08, -0.6050, 0.00, 0),
+    (0.1, 0.0230, 0.023, 0.020, 0.00, -0.6060, 0.00, 0),
+    (0.1, 0.0230, 0.046, 0.020, 0.06, -0.6050, 0.00, 0),
+)
+
+
+def shepp_logan_volume(size):
+    coords = np.linspace(-1, 1, size, dtype=np.float32)
+    z, y, x = np.meshgrid(coords, coords, coords, indexing='ij')
+    volume = np.zeros((size, size, size), dtype=np.float32)
+
+    for A, a, b, c, x0, y0, z0, phi in SHEPP_LOGAN_ELLIPSOIDS:
+        phi = np.deg2rad(phi)
+        x_rot = (x - x0) * np.cos(phi) + (y - y0) * np.sin(phi)
+        y_rot = -(x - x0) * np.sin(phi) + (y - y0) * np.cos(phi)
+        inside = (x_rot / a) ** 2 + (y_rot / b) ** 2 + ((z - z0) / c) ** 2 <= 1
+        volume[inside] += A
+
+    return volume
+
+
+def load_volume(path):
+    volume = np.load(path).astype(np.float32)
+    if volume.ndim == 2:
+        volume = volume[np.newaxis]
+    if volume.ndim != 3:
+        raise ValueError('Phantom volume must have 2 or 3 dimensions, but it has {}'.format(volume.ndim))
+    return volume
+
+
+def standard_normal_noise(size, seed=None):
+    if hasattr(np.random, 'default_rng'):
+        return np.random.default_rng(seed).standard_normal(size, dtype=np.float32)
+    return np.random.RandomState(seed).standard_normal(size).astype(np.float32)
+
+
+class ProjectionSimulator:
+    # parallel-beam projections of a phantom volume (z, y, x) rotating around vertical z axis
+    def __init__(self, volume, height, width, attenuation, counts_scale, dark_level, pixels_per_x_unit,
+                 cache_size=1024, seed=None):
+        self.volume = volume
+        self.height = height
+        self.width = width
+        self.counts_scale = counts_scale
+        self.dark_level = dark_level
+        self.pixels_per_x_unit = pixels_per_x_unit
+        self.cache_size = cache_size
+
+        nz, ny, nx = volume.shape
+        self.ray_count = max(ny, nx)
+        # the longest ray through phantom gives total attenuation
+        max_value = float(np.abs(volume).max()) or 1.0
+        self.mu = attenuation / (self.ray_count * max_value)
+
+        # detector position (s) and position along ray (t) relative to rotation axis, rotated per angle
+        half = (self.ray_count - 1) / 2.0
+        offsets = np.arange(self.ray_count, dtype=np.float32) - half
+        self.grid_s, self.grid_t = np.meshgrid(offsets, offsets, indexing='ij')
+        self.center_y = (ny - 1) / 2.0
+        self.center_x = (nx - 1) / 2.0
+
+        self.row_index = np.arange(height) * nz // height
+        self.sinogram = OrderedDict()
+
+        # gaussian approximation of poisson noise, frames take windows at random offsets
+        self.noise = standard_normal_noise(height * width + height * width // 8, seed)
+        self.noise_rng = np.random.RandomState()
+
+        self.expected_key = None
+        self.expected = np.empty((height, width), dtype=np.float32)
+        self.expected_sqrt = np.empty((height, width), dtype=np.float32)
+        self.buffer = np.empty((height, width), dtype=np.float32)
+        self.lock = threading.Lock()
+
+    def rotation_grid(self, angle):
+        angle = np.deg2rad(angle)
+        cos, sin = np.float32(np.cos(angle)), np.float32(np.sin(angle))
+        ix = np.rint(self.grid_s * cos - self.grid_t * sin + self.center_x).astype(np.intp)
+        iy = np.rint(self.grid_s * sin + self.grid_t * cos + self.center_y).astype(np.intp)
+        valid = (ix >= 0) & (ix < self.volume.shape[2]) & (iy >= 0) & (iy < self.volume.shape[1])
+        ix[~valid] = 0
+        iy[~valid] = 0
+        return iy, ix, valid
+
+    def transmission(self, angle):
+        # one sinogram row per angle: transmission (z, s) with extra column of ones for rays outside object
+        key = round(float(angle) % 360, 2)
+        if key in self.sinogram:
+            self.sinogram.move_to_end(key)
+            return self.sinogram[key]
+
+        iy, ix, valid = self.rotation_grid(key)
+        samples = self.volume[:, iy, ix]
+        samples *= valid
+        line_integrals = samples.sum(axis=2)
+
+        transmission = np.ones((self.volume.shape[0], self.ray_count + 1), dtype=np.float32)
+        np.exp(-self.mu * line_integrals, out=transmission[:, :-1])
+
+        self.sinogram[key] = transmission
+        if len(self.sinogram) > self.cache_size:
+            self.sinogram.popitem(last=False)
+        return transmission
+
+    def update_expected(self, angle, x_position, flat):
+        key = (round(float(angle) % 360, 2), x_position, flat)
+        if key == self.expected_key:
+            return
+
+        if flat > 0:
+            shift = x_position * self.pixels_per_x_unit
+            columns = np.floor((np.arange(self.width) - (self.width - 1) / 2.0 - shift)
+                               * self.ray_count / self.width + self.ray_count / 2.0).astype(np.intp)
+            columns[(columns < 0) | (columns >= self.ray_count)] = self.ray_count
+            transmission = self.transmission(angle)
+            np.take(transmission.take(self.row_index, axis=0), columns, axis=1, out=self.expected)
+            self.expected *= flat
+            self.expected += self.dark_level
+        else:
+            self.expected.fill(self.dark_level)
+
+        np.sqrt(self.expected, out=self.expected_sqrt)
+        self.expected_key = key
+
+    def render(self, frame, angle, x_position, shutter_open, voltage, current, exposure, rng=None):
+        flat = 0.0
+        if shutter_open and exposure:
+            flat = float(voltage) * float(current) * float(exposure) * self.counts_scale
+
+        with self.lock:
+            self.update_expected(angle, x_position, flat)
+
+            size = self.height * self.width
+            offset = (rng or self.noise_rng).randint(0, self.noise.size - size + 1)
+            noise = self.noise[offset:offset + size].reshape(self.height, self.width)
+
+            np.multiply(noise, self.expected_sqrt, out=self.buffer)
+            self.buffer += self.expected
+            np.clip(self.buffer, 0, np.iinfo(frame.dtype).max, out=self.buffer)
+            np.copyto(frame, self.buffer, casting='unsafe')
+
+        return frame
@@ -1,14 +1,20 @@
-from flask import Blueprint, request, send_file
+import json
+
+from flask import Blueprint, Response, current_app, request
+from werkzeug.local import LocalProxy
 
-from .tomograph import Tomograph
 from .experiment import *
+from .live_view import LIVE_VIEW_BOUNDARY
+from .tomograph import BATCH_METHODS, READ_ONLY_METHODS
+from . import metrics
 from .constants import *
 
 
 bp_main = Blueprint('main', __name__, url_prefix='/')
 bp_tomograph = Blueprint('tomograph', __name__, url_prefix='/tomograph/<int:tomo_num>')
 
-tomograph = Tomograph()
+# registry of current app, it is created by create_app
+tomographs = LocalProxy(lambda: current_app.extensions['tomographs'])
 
 
 @bp_tomograph.after_request
@@ -24,13 +30,42 @@ def main_route():
     return 'RBTM experiment mock'
 
 
+@bp_main.route('/metrics', methods=['GET'])
+def metrics_route():
+    # queue depths and states are read from tomographs at scrape time, hot path doesn't update them
+    for tomo_num, tomograph in list(tomographs.tomographs.items()):
+        metrics.UPLOAD_QUEUE_DEPTH.set(tomograph.frame_uploader.queue_depth(), tomo_num)
+        metrics.EXPERIMENT_RUNNING.set(tomograph.current_experiment is not None, tomo_num)
+        frame_cache_stats = tomograph.frame_cache.stats()
+        metrics.FRAME_CACHE_BYTES.set(frame_cache_stats['bytes'], tomo_num)
+        metrics.FRAME_CACHE_HITS.set(frame_cache_stats['frame hits'], tomo_num)
+        metrics.FRAME_CACHE_MISSES.set(frame_cache_stats['frame misses'], tomo_num)
+        if tomograph.frame_spool is not None:
+            frame_spool_stats = tomograph.frame_spool.stats()
+            metrics.SPOOL_PENDING_REQUESTS.set(frame_spool_stats['pending'], tomo_num)
+            metrics.SPOOL_PENDING_BYTES.set(frame_spool_stats['pending bytes'], tomo_num)
+            metrics.SPOOL_DRAINED.set(frame_spool_stats['drained'], tomo_num)
+            metrics.SPOOL_REJECTED.set(frame_spool_stats['rejected'], tomo_num)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 # State route
 @bp_tomograph.route('/state', methods=['GET'])
 def check_state(tomo_num):
+    try:
+        tomograph = tomographs.get(tomo_num)
+    except ModExpError as e:
+        return e.create_response()
+
     tomo_state, exception_message = tomograph.tomo_state()
     return create_response(success=True, result=tomo_state, exception_message=exception_message)
 
 
+@bp_tomograph.route('/state/snapshot', methods=['GET'])
+def state_snapshot(tomo_num):
+    return call_method_create_response(tomo_num, method_name='get_state_snapshot')
+
+
 # Source routes
 @bp_tomograph.route('/source/power-on', methods=['GET'])
 def source_power_on(tomo_num):
@@ -145,7 +180,8 @@ def detector_get_frame(tomo_num):
     success, exposure, response_if_fail = check_request(request.data)
     if not success:
         return response_if_fail
-    return call_method_create_response(tomo_num, method_name='get_frame', args=(exposure, True), GET_FRAME_method=True)
+    return call_method_create_response(tomo_num, method_name='get_frame', args=(exposure, True), GET_FRAME_method=True,
+                                       preview_params=get_preview_params(request.args))
 
 
 @bp_tomograph.route('/detector/get-frame-with-closed-shutter', methods=['POST'])
@@ -153,7 +189,69 @@ def detector_get_frame_with_closed_shutter(tomo_num):
     success, exposure, response_if_fail = check_request(request.data)
     if not success:
         return response_if_fail
-    return call_method_create_response(tomo_num, method_name='get_frame', args=(exposure, False), GET_FRAME_method=True)
+    return call_method_create_response(tomo_num, method_name='get_frame', args=(exposure, False), GET_FRAME_method=True,
+                                       preview_params=get_preview_params(request.args))
+
+
+@bp_tomograph.route('/detector/replay-frame', methods=['POST'])
+def detector_replay_frame(tomo_num):
+    # frame of replayed experiment from its metadata (as it was sent to storage): ?encoding=npy
+    success, frame_metadata, response_if_fail = check_request(request.data)
+    if not success:
+        return response_if_fail
+    encoding = request.args.get('encoding', default=FRAME_ENCODING)
+    if encoding not in CODECS.keys():
+        return create_response(success=False,
+                               error='Unknown frame encoding, available: ' + ', '.join(sorted(CODECS.keys())))
+
+    try:
+        tomograph = tomographs.get(tomo_num)
+        raw_image = tomograph.regenerate_frame(frame_metadata)
+    except ModExpError as e:
+        return e.create_response()
+
+    try:
+        frame_data = get_codec(encoding).encode(raw_image).read()
+    finally:
+        tomograph.frame_source.release(raw_image)
+    return Response(frame_data, mimetype='application/octet-stream')
+
+
+@bp_tomograph.route('/detector/frame-cache', methods=['GET'])
+def detector_frame_cache(tomo_num):
+    return call_method_create_response(tomo_num, method_name='get_frame_cache_stats')
+
+
+@bp_tomograph.route('/storage/spool', methods=['GET'])
+def storage_spool(tomo_num):
+    # drain progress of spool, None if tomograph sends frames to storage directly
+    return call_method_create_response(tomo_num, method_name='get_frame_spool_stats')
+
+
+@bp_tomograph.route('/detector/live', methods=['GET'])
+def detector_live(tomo_num):
+    # endless stream of frames: ?exposure=100&rate=5&format=png (multipart) or format=raw (header + uint16 pixels)
+    exposure = request.args.get('exposure', type=float)
+    rate = request.args.get('rate', default=1.0, type=float)
+    frame_format = request.args.get('format', default='png')
+
+    if exposure is None or exposure < 0.1 or 16000 < exposure:
+        return create_response(success=False, error='Exposure must have value from 0.1 to 16000')
+    if rate is None or rate <= 0 or LIVE_VIEW_MAX_RATE < rate:
+        return create_response(success=False, error='Rate must have value from 0 to {}'.format(LIVE_VIEW_MAX_RATE))
+    if frame_format not in ('png', 'raw'):
+        return create_response(success=False, error='Format must be png or raw')
+
+    try:
+        tomograph = tomographs.get(tomo_num)
+        tomograph.basic_tomo_check(from_experiment=False)
+    except ModExpError as e:
+        return e.create_response()
+
+    frames = tomograph.live_view.stream(exposure, rate, frame_format)
+    if frame_format == 'png':
+        return Response(frames, mimetype='multipart/x-mixed-replace; boundary=' + LIVE_VIEW_BOUNDARY)
+    return Response(frames, mimetype='application/octet-stream')
 
 
 @bp_tomograph.route('/detector/chip_temp', methods=['GET'])
@@ -166,6 +264,31 @@ def detector_get_hous_temperature(tomo_num):
     return call_method_create_response(tomo_num, method_name='get_detector_hous_temperature')
 
 
+# Batch route
+@bp_tomograph.route('/batch', methods=['POST'])
+def batch(tomo_num):
+    # {"steps": [{"method": "source_set_voltage", "args": [40.0]}, {"method": "open_shutter"}, ...]},
+    # result is list of responses of steps in the same order
+    success, data, response_if_fail = check_request(request.data)
+    if not success:
+        return response_if_fail
+
+    success, error = check_batch_steps(data)
+    if not success:
+        return create_response(success=False, error=error)
+
+    try:
+        tomograph = tomographs.get(tomo_num)
+    except ModExpError as e:
+        return e.create_response()
+
+    results = tomograph.run_batch([(step['method'], step.get('args', [])) for step in data['steps']])
+    for step_num, result in enumerate(results):
+        if not result['success']:
+            return create_response(success=False, error='Step {} failed'.format(step_num), result=results)
+    return create_response(success=True, result=results)
+
+
 # Experiment routes
 @bp_tomograph.route('/experiment/start', methods=['POST'])  # TODO: POST?
 def experiment_start(tomo_num):
@@ -186,6 +309,11 @@ def experiment_start(tomo_num):
     if not success:
         return create_response(success=success, error=error)
 
+    try:
+        tomograph = tomographs.get(tomo_num)
+    except ModExpError as e:
+        return e.create_response()
+
     tomo_state, exception_message = tomograph.tomo_state()
     if tomo_state == 'unavailable':
         return create_response(success=False, error="Could not connect with tomograph",
@@ -196,27 +324,78 @@ def experiment_start(tomo_num):
         return create_response(success=False, error="Undefined tomograph state")
 
     try:
-        send_to_storage(STORAGE_EXP_START_URI, data=request.data)
+        send_exp_start_to_storage(request.data, storage_client=tomograph.storage_client,
+                                  frame_spool=tomograph.frame_spool)
     except ModExpError as e:
         return e.create_response()
 
-    if exp_param['advanced']:
-        pass
-        # thr = threading.Thread(target=carry_out_advanced_experiment, args=(tomograph, exp_param))
-    else:
-        thr = threading.Thread(target=tomograph.carry_out_simple_experiment, args=(exp_param,))
-        thr.start()
+    try:
+        predicted_duration = tomograph.start_experiment(exp_param)
+    except ModExpError as e:
+        return e.create_response()
 
-    return create_response(True)
+    # duration on real rig in seconds (None for advanced experiment), mock runs it speedup times faster
+    return create_response(True, result={'predicted duration': predicted_duration,
+                                         'speedup': tomograph.timing.speedup})
+
+
+@bp_tomograph.route('/experiment/plan', methods=['POST'])
+def experiment_plan(tomo_num):
+    # frames which simple experiment with these parameters would take, experiment isn't started
+    # at most PLAN_PREVIEW_FRAMES frames from ?offset= are returned, 'frames count' is size of whole plan
+    offset = request.args.get('offset', default=0, type=int)
+    limit = request.args.get('limit', default=PLAN_PREVIEW_FRAMES, type=int)
+    if not (offset >= 0 and 0 < limit <= PLAN_PREVIEW_FRAMES):
+        return create_response(success=False,
+                               error='Offset must be non-negative, limit must be from 1 to {}'.format(PLAN_PREVIEW_FRAMES))
+
+    success, data, response_if_fail = check_request(request.data)
+    if not success:
+        return response_if_fail
+
+    if not ((type(data) is dict) and ('experiment parameters' in data.keys())
+            and (type(data['experiment parameters']) is dict)):
+        return create_response(success=False, error='Incorrect format of keywords')
+
+    exp_param = data['experiment parameters']
+    exp_param['exp_id'] = data.get('exp_id', '')
+    exp_param['advanced'] = False
+    success, error = check_and_prepare_exp_parameters(exp_param)
+    if not success:
+        return create_response(success=success, error=error)
+
+    try:
+        tomograph = tomographs.get(tomo_num)
+    except ModExpError as e:
+        return e.create_response()
+
+    return create_response(True, result=tomograph.preview_scan_plan(exp_param, offset, limit))
+
+
+@bp_tomograph.route('/experiment/progress', methods=['GET'])
+def experiment_progress(tomo_num):
+    # server-sent events: start, phase (dark, empty, data), progress of every frame, finish
+    try:
+        tomograph = tomographs.get(tomo_num)
+    except ModExpError as e:
+        return e.create_response()
+
+    return Response(tomograph.progress.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @bp_tomograph.route('/experiment/stop', methods=['GET'])  # TODO: GET?
 def experiment_stop(tomo_num):
     exp_stop_reason_txt = "unknown"
 
-    if tomograph.current_experiment is not None:
-        tomograph.current_experiment.to_be_stopped = True
-        tomograph.current_experiment.stop_exception = ModExpError(error=exp_stop_reason_txt, stop_msg=SOMEONE_STOP_MSG)
+    try:
+        tomograph = tomographs.get(tomo_num)
+    except ModExpError as e:
+        return e.create_response()
+
+    current_experiment = tomograph.current_experiment
+    if current_experiment is not None:
+        current_experiment.stop(ModExpError(error=exp_stop_reason_txt, stop_msg=SOMEONE_STOP_MSG))
 
     return create_response(True)
 
@@ -229,27 +408,71 @@ def create_response(success=True, exception_message='', error='', result=None):
         'error': error,
         'result': result,
     }
-    return json.dumps(response_dict)
+    return dumps(response_dict)
 
 
-def call_method_create_response(tomo_num, method_name, args=(), GET_FRAME_method=False):
+def call_method_create_response(tomo_num, method_name, args=(), GET_FRAME_method=False, preview_params=None):
 
     if type(args) not in (tuple, list):
         args = (args,)
 
     try:
-        result = getattr(tomograph, method_name)(*args)
+        tomograph = tomographs.get(tomo_num)
+        if method_name in READ_ONLY_METHODS:
+            # readers take immutable state snapshot, they don't wait for batches and moves
+            result = getattr(tomograph, method_name)(*args)
+        else:
+            # the same lock as batches and experiment start take, so single calls don't come between their steps
+            with tomograph.lock:
+                result = getattr(tomograph, method_name)(*args)
     except ModExpError as e:
         return e.create_response()
 
     if not GET_FRAME_method:
         return create_response(success=True, result=result)
     else:
-        success, ModExpError_if_fail = prepare_send_frame(raw_image_with_metadata=result, experiment=None)
-        if not success:
-            return ModExpError_if_fail.create_response()
-
-        return send_file('../' + FRAME_PNG_FILENAME, mimetype='image/png')
+        raw_image = result.raw_image
+        try:
+            png = make_png(raw_image, **(preview_params or {}))
+        except ModExpError as e:
+            return e.create_response()
+        finally:
+            tomograph.frame_source.release(raw_image)
+
+        return Response(png, mimetype='image/png')
+
+
+def get_preview_params(args):
+    # optional size of preview and contrast window: ?width=500&height=500&low=100&high=30000
+    preview_params = {
+        'width': args.get('width', type=int),
+        'height': args.get('height', type=int),
+        'low': args.get('low', type=float),
+        'high': args.get('high', type=float),
+    }
+    for key in ('width', 'height'):
+        if preview_params[key] is not None and preview_params[key] <= 0:
+            preview_params[key] = None
+    return preview_params
+
+
+def check_batch_steps(data):
+    if not ((type(data) is dict) and ('steps' in data.keys()) and (type(data['steps']) is list)):
+        return False, 'Incorrect format of keywords'
+    if not (0 < len(data['steps']) <= BATCH_MAX_STEPS):
+        return False, 'Batch must have from 1 to {} steps'.format(BATCH_MAX_STEPS)
+
+    for step_num, step in enumerate(data['steps']):
+        if not ((type(step) is dict) and ('method' in step.keys()) and (type(step['method']) is str)):
+            return False, 'Incorrect format of step {}'.format(step_num)
+        if step['method'] not in BATCH_METHODS:
+            return False, 'Unknown method of step {}: {}'.format(step_num, step['method'])
+        if not (type(step.get('args', [])) is list):
+            return False, 'Incorrect format of step {}: args must be list'.format(step_num)
+        if len(step.get('args', [])) > BATCH_METHODS[step['method']]:
+            return False, 'Too many args of step {}: {} takes {} at most'.format(
+                step_num, step['method'], BATCH_METHODS[step['method']])
+    return True, ''
 
 
 def check_request(request_data):
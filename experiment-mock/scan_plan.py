@@ -0,0 +1,128 @@
+import numpy as np
+
+MODES = ('dark', 'empty', 'data')
+MODE_DARK, MODE_EMPTY, MODE_DATA = range(len(MODES))
+ORDERS = ('sequential', 'golden angle')
+
+PLAN_DTYPE = np.dtype([
+    ('mode', np.uint8),
+    ('angle', np.float64),
+    ('exposure', np.float64),
+    ('shutter_open', np.bool_),
+    ('object_present', np.bool_),
+    ('frame_num', np.uint32),
+])
+
+GOLDEN_RATIO_FRACTION = (np.sqrt(5) - 1) / 2
+
+
+def golden_angle_order(count):
+    # permutation of sequential steps, each next step falls into the largest gap between visited angles
+    fractions = (np.arange(count) * GOLDEN_RATIO_FRACTION) % 1
+    return np.argsort(np.argsort(fractions, kind='stable'), kind='stable')
+
+
+class ScanPlan:
+    # all frames of simple experiment as one structured array, built and checked before experiment starts
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def compile(cls, exp_param, initial_angle=0):
+        dark, empty, data = exp_param['DARK'], exp_param['EMPTY'], exp_param['DATA']
+        step_count = data['step count']
+        count_per_step = data['count per step']
+        interleave = empty.get('interleave', 0)
+
+        steps = np.arange(step_count)
+        if data.get('order', 'sequential') == 'golden angle':
+            steps = golden_angle_order(step_count)
+        data_angles = np.round(steps * data['angle step'] + initial_angle, 2) % 360
+
+        # dark and empty frames are taken without moving rotation stage
+        blocks = [block(MODE_DARK, initial_angle, dark['exposure'], dark['count']),
+                  block(MODE_EMPTY, initial_angle, empty['exposure'], empty['count'])]
+        if interleave > 0:
+            # flat fields after every interleave steps of data
+            for start in range(0, step_count, interleave):
+                blocks.append(data_block(data_angles[start:start + interleave], data['exposure'], count_per_step))
+                if start + interleave < step_count:
+                    last_angle = data_angles[start + interleave - 1]
+                    blocks.append(block(MODE_EMPTY, last_angle, empty['exposure'], empty['count']))
+        else:
+            blocks.append(data_block(data_angles, data['exposure'], count_per_step))
+
+        entries = np.concatenate(blocks)
+        entries['frame_num'] = np.arange(len(entries))
+        entries['shutter_open'] = entries['mode'] != MODE_DARK
+        entries['object_present'] = entries['mode'] != MODE_EMPTY
+        return cls(entries)
+
+    def block_starts(self):
+        # indexes of frames where mode, angle or exposure changes, tomograph is set up only there
+        entries = self.entries
+        changed = np.ones(len(entries), dtype=bool)
+        changed[1:] = ((entries['mode'][1:] != entries['mode'][:-1])
+                       | (entries['angle'][1:] != entries['angle'][:-1])
+                       | (entries['exposure'][1:] != entries['exposure'][:-1]))
+        return np.flatnonzero(changed)
+
+    def counts(self):
+        return {mode: int((self.entries['mode'] == code).sum()) for code, mode in enumerate(MODES)}
+
+    def to_dict(self, offset=0, limit=None):
+        # per-frame lists only for frames from offset to offset + limit, counts are for whole plan
+        entries = self.entries[offset:] if limit is None else self.entries[offset:offset + limit]
+        return {
+            'frames count': len(self.entries),
+            'counts': self.counts(),
+            'offset': offset,
+            'mode': [MODES[code] for code in entries['mode'].tolist()],
+            'angle': entries['angle'].tolist(),
+            'exposure': entries['exposure'].tolist(),
+            'shutter open': entries['shutter_open'].tolist(),
+            'object present': entries['object_present'].tolist(),
+            'frame num': entries['frame_num'].tolist(),
+        }
+
+
+def frames_count(exp_param):
+    # size of plan counted from parameters, so too big plan is rejected without building it
+    dark, empty, data = exp_param['DARK'], exp_param['EMPTY'], exp_param['DATA']
+    step_count = data['step count']
+    interleave = empty.get('interleave', 0)
+    count = dark['count'] + empty['count'] + step_count * data['count per step']
+    if interleave > 0 and step_count > 0:
+        count += (-(-step_count // interleave) - 1) * empty['count']
+    return count
+
+
+def check_plan_parameters(exp_param):
+    # same checks as on frames of compiled plan: blocks without frames don't matter
+    dark, empty, data = exp_param['DARK'], exp_param['EMPTY'], exp_param['DATA']
+    blocks = ((dark['exposure'], dark['count']),
+              (empty['exposure'], empty['count']),
+              (data['exposure'], data['step count'] * data['count per step']))
+    for exposure, count in blocks:
+        if count > 0 and not (0.1 <= exposure <= 16000):
+            return False, 'Exposure must have value from 0.1 to 16000'
+    if data['step count'] > 0 and not np.isfinite(data['angle step']):
+        return False, 'Angles must be finite numbers'
+    return True, ''
+
+
+def block(mode, angle, exposure, count):
+    entries = np.zeros(count, dtype=PLAN_DTYPE)
+    entries['mode'] = mode
+    entries['angle'] = angle
+    entries['exposure'] = exposure
+    return entries
+
+
+def data_block(angles, exposure, count_per_step):
+    entries = block(MODE_DATA, 0, exposure, len(angles) * count_per_step)
+    entries['angle'] = np.repeat(angles, count_per_step)
+    return entries
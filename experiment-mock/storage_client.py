@@ -0,0 +1,150 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from . import metrics
+from .constants import STORAGE_URI
+
+
+class StorageError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return repr(self.message)
+
+
+class StorageRejectedError(StorageError):
+    # storage answered, but didn't accept request, the same request will be rejected again
+    pass
+
+
+class StorageNotSupportedError(StorageRejectedError):
+    pass
+
+
+class StorageClient:
+    # keep-alive connections shared by all upload workers, retries only for requests marked as idempotent;
+    # requests to STORAGE_URI go to storage_uri, e.g. to local stub storage
+    def __init__(self, pool_size, connect_timeout, read_timeout, retries, backoff, latencies_count=1000,
+                 storage_uri=STORAGE_URI):
+        self.storage_uri = storage_uri
+        self.pool_size = pool_size
+        self.session = None
+
+        self.batches_unsupported = False
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=latencies_count)
+        self.requests_count = 0
+        self.retries_count = 0
+        self.errors_count = 0
+
+    def get_session(self):
+        with self.lock:
+            if self.session is None:
+                self.session = create_session(self.pool_size)
+            return self.session
+
+    def post(self, uri, data, files=None, idempotent=False):
+        session = self.get_session()
+        if self.storage_uri != STORAGE_URI and uri.startswith(STORAGE_URI):
+            uri = self.storage_uri + uri[len(STORAGE_URI):]
+        endpoint = urlsplit(uri).path if metrics.enabled else None
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if attempt:
+                # full jitter: random delay up to exponentially growing limit
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+                rewind(files)
+                self.count(retries_count=1)
+                metrics.STORAGE_RETRIES.inc(endpoint)
+
+            start = time.time()
+            try:
+                response = session.post(uri, data=data, files=files, timeout=self.timeout)
+            except OSError as e:  # exceptions of requests are subclasses of OSError
+                error = 'Could not send to storage: {}'.format(e)
+            else:
+                if response.status_code in (404, 405):
+                    self.record_latency(time.time() - start, endpoint)
+                    raise StorageNotSupportedError('Storage does not support {}'.format(uri))
+                if response.status_code < 500:
+                    self.record_latency(time.time() - start, endpoint)
+                    return parse_response(response)
+                error = 'Storage responded with status {}'.format(response.status_code)
+            self.record_latency(time.time() - start, endpoint)
+
+        self.count(errors_count=1)
+        metrics.STORAGE_ERRORS.inc(endpoint)
+        raise StorageError(error)
+
+    def record_latency(self, latency, endpoint=None):
+        metrics.STORAGE_REQUEST_SECONDS.observe(latency, endpoint)
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests_count += 1
+
+    def count(self, retries_count=0, errors_count=0):
+        with self.lock:
+            self.retries_count += retries_count
+            self.errors_count += errors_count
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                'requests': self.requests_count,
+                'retries': self.retries_count,
+                'errors': self.errors_count,
+            }
+        if latencies:
+            stats['latency'] = {
+                'mean': sum(latencies) / len(latencies),
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[int(len(latencies) * 0.95)],
+                'max': latencies[-1],
+            }
+        return stats
+
+
+def create_session(pool_size):
+    # requests is one of the slowest imports, mock which never talks to storage doesn't import it
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def rewind(files):
+    if not files:
+        return
+    for file in files.values():
+        if type(file) is tuple:
+            file = file[1]
+        file.seek(0)
+
+
+def parse_response(response):
+    try:
+        storage_resp_dict = json.loads(response.content)
+    except (ValueError, TypeError):
+        raise StorageRejectedError('Storage\'s response is not JSON')
+
+    if type(storage_resp_dict) is not dict or not ('result' in storage_resp_dict.keys()):
+        raise StorageRejectedError("Storage\'s response has incorrect format (no 'result' key)")
+
+    if storage_resp_dict['result'] != 'success':
+        raise StorageRejectedError('Storage\'s response:  ' + str(storage_resp_dict['result']))
+
+    return storage_resp_dict
@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubStorageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # response is written by several small writes, with Nagle's algorithm each keep-alive request waits ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        status, result = stub.register(self.path, body)
+        if stub.delay:
+            time.sleep(stub.delay)
+
+        response = json.dumps({'result': result}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubStorageServer:
+    # local storage answering 'success' to every post, for tests and benchmarks;
+    # first fail_count requests get 503 to check retries
+    def __init__(self, host='127.0.0.1', port=0, delay=0, fail_count=0):
+        self.delay = delay
+        self.fail_count = fail_count
+        self.lock = threading.Lock()
+        self.requests = []
+        self.received_bytes = 0
+
+        self.server = ThreadingHTTPServer((host, port), StubStorageHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def uri(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def register(self, path, body):
+        with self.lock:
+            self.requests.append(path)
+            self.received_bytes += len(body)
+            if self.fail_count > 0:
+                self.fail_count -= 1
+                return 503, 'unavailable'
+        return 200, 'success'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    server = StubStorageServer(port=5006)
+    print('Stub storage is listening on {}'.format(server.uri))
+    server.server.serve_forever()
@@ -0,0 +1,62 @@
+import time
+import numpy as np
+
+from .scan_plan import MODE_DARK, MODE_EMPTY, MODE_DATA
+
+
+class TimingModel:
+    # durations of hardware operations in seconds of real rig, all waits are divided by speedup
+    def __init__(self, speedup, angle_speed, x_speed, shutter_latency, readout_time, source_ramp_time,
+                 source_off_pause, dark_settle_time):
+        self.speedup = speedup
+        self.angle_speed = angle_speed  # degrees per second
+        self.x_speed = x_speed  # position units per second
+        self.shutter_latency = shutter_latency
+        self.readout_time = readout_time
+        self.source_ramp_time = source_ramp_time
+        self.source_off_pause = source_off_pause
+        self.dark_settle_time = dark_settle_time
+
+    def wait(self, seconds, cancel_event=None):
+        # returns True if the wait was interrupted by cancel_event
+        if seconds <= 0 or self.speedup <= 0:
+            return cancel_event is not None and cancel_event.is_set()
+        if cancel_event is None:
+            time.sleep(seconds / self.speedup)
+            return False
+        return cancel_event.wait(seconds / self.speedup)
+
+    def angle_move_time(self, old_angle, new_angle):
+        distance = abs(new_angle - old_angle) % 360
+        return min(distance, 360 - distance) / self.angle_speed
+
+    def x_move_time(self, old_x, new_x):
+        return abs(new_x - old_x) / self.x_speed
+
+    def frame_time(self, exposure):
+        # exposure is in milliseconds
+        return (exposure or 0) / 1000.0 + self.readout_time
+
+    def predict_plan_duration(self, scan_plan, angle_position, x_position, away_x_position):
+        # the same operations as Experiment.run does for the plan, frames with open shutter open and close it
+        entries = scan_plan.entries
+        modes = entries['mode']
+        block_starts = scan_plan.block_starts()
+
+        duration = self.source_ramp_time
+        duration += float((entries['exposure'] / 1000.0).sum()) + len(entries) * self.readout_time
+        duration += int(entries['shutter_open'].sum()) * 2 * self.shutter_latency
+
+        block_modes = modes[block_starts]
+        mode_starts = np.ones(len(block_modes), dtype=bool)
+        mode_starts[1:] = block_modes[1:] != block_modes[:-1]
+        mode_changes = block_modes[mode_starts]
+        duration += int((mode_changes == MODE_DARK).sum()) * (self.shutter_latency + self.dark_settle_time)
+        # moving away for empty frames and back
+        duration += int((mode_changes == MODE_EMPTY).sum()) * 2 * self.x_move_time(x_position, away_x_position)
+
+        data_angles = entries['angle'][block_starts[block_modes == MODE_DATA]]
+        if len(data_angles):
+            moves = np.abs(np.diff(np.concatenate(([angle_position], data_angles)))) % 360
+            duration += float(np.minimum(moves, 360 - moves).sum()) / self.angle_speed
+        return duration
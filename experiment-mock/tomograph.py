@@ -1,28 +1,100 @@
-import datetime
+import os
+import threading
 import time
 import json
-
-from .experiment import ModExpError, Experiment, create_event, send_message_to_storage_webpage
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import lru_cache
+
+from .experiment import ModExpError, Experiment, AdvancedExperiment, create_event, send_message_to_storage_webpage, prepare_send_frame, \
+    discard_frame, create_storage_client, process_encoder, send_spooled_request
+from .storage_client import StorageRejectedError
+from .frame_uploader import FrameUploader
+from .frame_source import FrameSource, frame_rng, conditions_rng
+from .frame_cache import FrameCache
+from .frame_spool import FrameSpool, spool_has_pending
+from .projection import ProjectionSimulator, shepp_logan_volume, load_volume
+from .live_view import LiveView
+from .progress import ProgressBroadcaster
+from .frame_metadata import Frame, FrameMetadata
+from .timing import TimingModel
+from .scan_plan import ScanPlan
+from . import metrics
 from .constants import *
 
 
+# mock only properties of tomograph, whole state is replaced by new tuple on every change
+TomographState = namedtuple('TomographState', (
+    'source_voltage', 'source_current', 'shutter_status', 'x_position', 'y_position', 'angle_position',
+    'prev_x_position', 'exposure', 'chip_temp', 'hous_temp', 'object_present',
+))
+
+# methods which only read immutable state snapshot, single calls of them don't wait for lock of tomograph
+READ_ONLY_METHODS = {
+    'source_get_voltage', 'source_get_current', 'shutter_state', 'get_x', 'get_y', 'get_angle', 'get_exposure',
+    'get_detector_chip_temperature', 'get_detector_hous_temperature', 'get_state_snapshot',
+}
+
+# methods of tomograph which can be steps of batch, the same as control routes call, with the most positional
+# args of step; from_experiment is never taken from step
+BATCH_METHODS = {
+    'source_power_on': 0, 'source_power_off': 0, 'source_set_voltage': 1, 'source_set_current': 1,
+    'source_get_voltage': 0, 'source_get_current': 0, 'open_shutter': 1, 'close_shutter': 1, 'shutter_state': 0,
+    'set_x': 1, 'set_y': 1, 'set_angle': 1, 'get_x': 0, 'get_y': 0, 'get_angle': 0, 'reset_to_zero_angle': 0,
+    'move_away': 0, 'move_back': 0, 'set_exposure': 1, 'get_exposure': 0, 'get_frame': 3,
+    'get_detector_chip_temperature': 0, 'get_detector_hous_temperature': 0, 'get_state_snapshot': 0,
+}
+
+
 class Tomograph:
 
-    def __init__(self):
+    def __init__(self, tomo_num=0, timing=None, frame_shape=(DETECTOR_FRAME_HEIGHT, DETECTOR_FRAME_WIDTH),
+                 storage_client=None, frame_simulation=FRAME_SIMULATION, frame_spool_dir=FRAME_SPOOL_DIR):
 
+        self.tomo_num = tomo_num
+        self.timing = timing if timing is not None else create_timing_model()
+        self.lock = threading.Lock()
         self.current_experiment = None
-
-        self.source_current = 0  # mock only property
-        self.source_voltage = 0  # mock only property
-        self.shutter_status = None  # mock only property
-        self.x_position = 0  # mock only property
-        self.y_position = 0  # mock only property
-        self.angle_position = 0  # mock only property
-        self.prev_x_position = None  # mock only property
-        self.exposure = None  # mock only property
-        self.chip_temp = 10  # mock only property
-        self.hous_temp = 12  # mock only property
-        self.object_present = True  # mock only property
+        self.experiment_thread = None
+        self.last_stop_latency = None
+        self.storage_client = storage_client if storage_client is not None else create_storage_client()
+        self.frame_uploader = FrameUploader(target=prepare_send_frame,
+                                            workers_count=UPLOAD_WORKERS_COUNT,
+                                            queue_size=UPLOAD_QUEUE_SIZE,
+                                            name='tomograph-{}-uploader'.format(tomo_num),
+                                            discard=discard_frame)
+        # frames wait in upload queue and workers, so pool covers all of them plus the one being acquired
+        frame_height, frame_width = frame_shape
+        self.frame_source = FrameSource(height=frame_height,
+                                        width=frame_width,
+                                        dtype=DETECTOR_FRAME_DTYPE,
+                                        buffers_count=UPLOAD_QUEUE_SIZE + UPLOAD_WORKERS_COUNT + 1,
+                                        simulator=create_simulator(frame_height, frame_width, frame_simulation),
+                                        seed=FRAME_NOISE_SEED,
+                                        shared=process_encoder.enabled)
+        self.frame_cache = create_frame_cache(tomo_num)
+        self.frame_spool = create_frame_spool(tomo_num, self.storage_client, frame_spool_dir)
+        self.live_view = LiveView(self)
+        self.progress = ProgressBroadcaster(heartbeat=PROGRESS_HEARTBEAT, max_events=PROGRESS_EVENTS_KEPT)
+
+        # readers take self.state once and get consistent view without lock, only writers are serialized
+        self.state_lock = threading.Lock()
+        self.state = TomographState(source_voltage=0,
+                                    source_current=0,
+                                    shutter_status=None,
+                                    x_position=0,
+                                    y_position=0,
+                                    angle_position=0,
+                                    prev_x_position=None,
+                                    exposure=None,
+                                    chip_temp=10,
+                                    hous_temp=12,
+                                    object_present=True)
+
+    def update_state(self, **changes):
+        with self.state_lock:
+            self.state = self.state._replace(**changes)
+        return self.state
 
     def basic_tomo_check(self, from_experiment):
         if not from_experiment:
@@ -32,14 +104,28 @@ class Tomograph:
             if self.current_experiment.to_be_stopped:
                 raise self.current_experiment.stop_exception
 
+    def wait(self, seconds, from_experiment=False):
+        # waits of experiment are interrupted as soon as it is stopped
+        if not from_experiment or self.current_experiment is None:
+            self.timing.wait(seconds)
+            return
+        self.current_experiment.clock += max(seconds, 0)
+        if self.timing.wait(seconds, cancel_event=self.current_experiment.stop_event):
+            raise self.current_experiment.stop_exception
+
     def tomo_state(self):
         if self.current_experiment is not None:
             return 'experiment', ""
         else:
             return 'ready', ""
 
+    def get_state_snapshot(self, from_experiment=False):
+        # can be polled while experiment is running, it never waits for experiment thread
+        return self.state._asdict()
+
     def source_power_on(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
+        self.wait(self.timing.source_ramp_time, from_experiment)
 
     def source_power_off(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
@@ -53,7 +139,7 @@ class Tomograph:
         if new_voltage < 2 or 60 < new_voltage:
             raise ModExpError(error='Voltage must have value from 2 to 60!')
 
-        self.source_voltage = new_voltage
+        self.update_state(source_voltage=new_voltage)
 
     def source_set_current(self, new_current, from_experiment=False):
         self.basic_tomo_check(from_experiment=from_experiment)
@@ -64,29 +150,31 @@ class Tomograph:
         if new_current < 2 or 80 < new_current:
             raise ModExpError(error='Current must have value from 2 to 80!')
 
-        self.source_current = new_current
+        self.update_state(source_current=new_current)
 
     def source_get_voltage(self, from_experiment=False):
         self.basic_tomo_check(from_experiment=from_experiment)
-        return self.source_voltage
+        return self.state.source_voltage
 
     def source_get_current(self, from_experiment=False):
         self.basic_tomo_check(from_experiment=from_experiment)
-        return self.source_current
+        return self.state.source_current
 
     def open_shutter(self, time_=0, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        self.shutter_status = 'OPEN'  # TODO: ask for correct value
-        return self.shutter_status
+        if self.state.shutter_status != 'OPEN':
+            self.wait(self.timing.shutter_latency, from_experiment)
+        return self.update_state(shutter_status='OPEN').shutter_status  # TODO: ask for correct value
 
     def close_shutter(self, time_=0, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        self.shutter_status = 'CLOSE'  # TODO: ask for correct value
-        return self.shutter_status
+        if self.state.shutter_status != 'CLOSE':
+            self.wait(self.timing.shutter_latency, from_experiment)
+        return self.update_state(shutter_status='CLOSE').shutter_status  # TODO: ask for correct value
 
     def shutter_state(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return json.dumps({'state': self.shutter_status})
+        return json.dumps({'state': self.state.shutter_status})
 
     def set_x(self, new_x, from_experiment=False):
         self.basic_tomo_check(from_experiment)
@@ -97,7 +185,8 @@ class Tomograph:
         if new_x < -5000 or 2000 < new_x:
             raise ModExpError(error='Position must have value from -5000 to 2000')
 
-        self.x_position = new_x
+        self.wait(self.timing.x_move_time(self.state.x_position, new_x), from_experiment)
+        self.update_state(x_position=new_x)
 
     def set_y(self, new_y, from_experiment=False):
         self.basic_tomo_check(from_experiment)
@@ -108,7 +197,8 @@ class Tomograph:
         if new_y < -5000 or 2000 < new_y:
             raise ModExpError(error='Position must have value from -30 to 30')
 
-        self.y_position = new_y
+        self.wait(self.timing.x_move_time(self.state.y_position, new_y), from_experiment)
+        self.update_state(y_position=new_y)
 
     def set_angle(self, new_angle, from_experiment=False):
         self.basic_tomo_check(from_experiment)
@@ -118,76 +208,160 @@ class Tomograph:
 
         new_angle %= 360
 
-        self.angle_position = new_angle
+        self.wait(self.timing.angle_move_time(self.state.angle_position, new_angle), from_experiment)
+        self.update_state(angle_position=new_angle)
 
     def get_x(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return self.x_position
+        return self.state.x_position
 
     def get_y(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return self.y_position
+        return self.state.y_position
 
     def get_angle(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return self.angle_position
+        return self.state.angle_position
 
     def reset_to_zero_angle(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        self.angle_position = 0
+        self.wait(self.timing.angle_move_time(self.state.angle_position, 0), from_experiment)
+        self.update_state(angle_position=0)
 
     def move_away(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        if self.object_present:
-            self.prev_x_position = self.x_position
-            self.x_position = -4200
-            self.object_present = False
+        state = self.state
+        if state.object_present:
+            self.wait(self.timing.x_move_time(state.x_position, AWAY_X_POSITION), from_experiment)
+            self.update_state(prev_x_position=state.x_position, x_position=AWAY_X_POSITION, object_present=False)
 
     def move_back(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        if not self.object_present:
-            if self.prev_x_position is not None:
-                self.x_position = self.prev_x_position
-                self.prev_x_position = None
-                self.object_present = True
-
-    def get_frame(self, exposure, with_open_shutter, send_to_webpage=False, from_experiment=False):
+        state = self.state
+        if not state.object_present:
+            if state.prev_x_position is not None:
+                self.wait(self.timing.x_move_time(state.x_position, state.prev_x_position), from_experiment)
+                self.update_state(x_position=state.prev_x_position, prev_x_position=None, object_present=True)
+
+    def get_frame(self, exposure, with_open_shutter, send_to_webpage=False, from_experiment=False, state_lock=None):
+        # state_lock is held while state is changed or read, but not while frame is exposed
+        state_lock = state_lock or nullcontext()
         self.basic_tomo_check(from_experiment)
 
-        if exposure:
-            self.set_exposure(exposure, from_experiment=from_experiment)
+        with state_lock:
+            if exposure:
+                self.set_exposure(exposure, from_experiment=from_experiment)
 
-        if with_open_shutter:
-            self.open_shutter(from_experiment=from_experiment)
-        else:
-            self.close_shutter(from_experiment=from_experiment)
+            if with_open_shutter:
+                self.open_shutter(from_experiment=from_experiment)
+            else:
+                self.close_shutter(from_experiment=from_experiment)
+            frame_time = self.timing.frame_time(self.state.exposure)
 
+        raw_image = None
         try:
-            frame_metadata_json = self.get_detector_frame(from_experiment=from_experiment)
+            self.wait(frame_time, from_experiment)
+            # metadata and frame are made from the same state
+            with state_lock:
+                state = self.state
+            frame_metadata = self.get_detector_frame(from_experiment=from_experiment, state=state)
+            conditions = {'angle': state.angle_position,
+                          'x_position': state.x_position,
+                          'shutter_open': (state.shutter_status == 'OPEN'),
+                          'voltage': state.source_voltage,
+                          'current': state.source_current,
+                          'exposure': state.exposure}
+            start = metrics.clock()
+            raw_image, cache_key = self.render_frame(conditions, from_experiment)
+            metrics.FRAME_GENERATE_SECONDS.observe_since(start, self.tomo_num)
+            metrics.FRAMES_GENERATED.inc(self.tomo_num)
         except Exception as e:
+            self.frame_source.release(raw_image)
+            raw_image = None
             raise e
         finally:
-            self.close_shutter(from_experiment=from_experiment)
-
-
+            try:
+                with state_lock:
+                    self.close_shutter(from_experiment=from_experiment)
+            except Exception:
+                # frame isn't returned when experiment is stopped at closing shutter, its buffer is given back
+                self.frame_source.release(raw_image)
+                raise
+
+        # frame depends on its conditions only if it's cached, encoded frame is also taken from cache by the key
+        frame_metadata.cached = cache_key is not None
+        return Frame(raw_image=raw_image, metadata=frame_metadata, cache_key=cache_key)
+
+    def render_frame(self, conditions, from_experiment):
+        experiment = self.current_experiment if from_experiment else None
+        if experiment is None:
+            return self.frame_source.get_frame(**conditions), None
+        if not experiment.use_frame_cache:
+            return self.frame_source.get_frame(rng=experiment.frame_rng(), **conditions), None
+
+        # mode of frame is defined by shutter and position, so it isn't a part of key
+        cache_key = (experiment.seed,) + tuple(sorted(conditions.items()))
+        rng = conditions_rng(experiment.seed, conditions) if experiment.seed is not None else None
+        raw_image = self.frame_cache.get_frame(cache_key, lambda: self.frame_source.get_frame(rng=rng, **conditions))
+        return raw_image, cache_key
+
+    def regenerate_frame(self, frame_metadata):
+        # frame of replayed experiment is rendered again from its metadata instead of being stored
         try:
-            frame_metadata = json.loads(frame_metadata_json)
-        except TypeError:
-            raise ModExpError(error='Could not convert frame\'s JSON into dict')
-
-        raw_image = None
-
-        frame_metadata['image_data']['raw_image'] = raw_image
-        raw_image_with_metadata = frame_metadata
-        return raw_image_with_metadata
+            seed = frame_metadata['image_data']['seed']
+            frame_num = int(frame_metadata['number'])
+            conditions = {'angle': frame_metadata['object']['angle position'],
+                          'x_position': frame_metadata['object']['horizontal position'],
+                          'shutter_open': frame_metadata['shutter']['open'],
+                          'voltage': frame_metadata['X-ray source']['voltage'],
+                          'current': frame_metadata['X-ray source']['current'],
+                          'exposure': frame_metadata['image_data']['exposure']}
+        except (KeyError, TypeError, ValueError):
+            raise ModExpError(error='Frame can be regenerated only from metadata of replayed experiment')
+
+        if frame_metadata['image_data'].get('cached'):
+            return self.frame_source.get_frame(rng=conditions_rng(seed, conditions), **conditions)
+        return self.frame_source.get_frame(rng=frame_rng(seed, frame_num), **conditions)
+
+    def run_batch(self, steps):
+        # steps (method name, args) are run under lock of tomograph, so other batches and experiment start
+        # can't come between them; steps after the failed one are not run
+        results = []
+        failed_step = None
+        with self.lock:
+            for step_num, (method_name, args) in enumerate(steps):
+                if failed_step is not None:
+                    error = 'Step is not run, step {} failed'.format(failed_step)
+                    results.append(ModExpError(error=error).to_response_dict())
+                    continue
+                try:
+                    result = batch_result(self, getattr(self, method_name)(*args, from_experiment=False))
+                except ModExpError as e:
+                    results.append(e.to_response_dict())
+                    failed_step = step_num
+                except Exception as e:
+                    error = 'Could not run {}'.format(method_name)
+                    results.append(ModExpError(error=error, exception_message=str(e)).to_response_dict())
+                    failed_step = step_num
+                else:
+                    results.append({'success': True, 'exception message': '', 'error': '', 'result': result})
+        return results
+
+    def get_frame_cache_stats(self):
+        return self.frame_cache.stats()
+
+    def get_frame_spool_stats(self):
+        if self.frame_spool is None:
+            return None
+        return self.frame_spool.stats()
 
     def get_detector_chip_temperature(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return self.chip_temp
+        return self.state.chip_temp
 
     def get_detector_hous_temperature(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return self.hous_temp
+        return self.state.hous_temp
 
     def set_exposure(self, new_exposure, from_experiment=False):
         self.basic_tomo_check(from_experiment)
@@ -199,54 +373,221 @@ class Tomograph:
             raise ModExpError(error=('Exposure must have value from 0.1 to 16000 (given is %.1f )' % new_exposure))
 
         new_exposure = round(new_exposure)
-        self.exposure = new_exposure
+        self.update_state(exposure=new_exposure)
 
     def get_exposure(self, from_experiment=False):
         self.basic_tomo_check(from_experiment)
-        return self.exposure
-
-    def get_detector_frame(self, from_experiment=False):
-
-        image = None
-        current_datetime = datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S")
-        timestamp = time.time()
-        detector_data = {'model': 'Ximea xiRAY'}
-        image_data = {'timestamp': timestamp,
-                      'datetime': current_datetime,
-                      'exposure': self.exposure,
-                      'detector': detector_data,
-                      'chip_temp': self.chip_temp,
-                      'hous_temp': self.hous_temp} # 'image': image,
-        object_data = {'present': self.object_present,
-                       'angle position': self.angle_position,
-                       'horizontal position': self.x_position,
-                       # 'vertical position': self.y_position
-                       }
-        shutter_state = json.loads(self.shutter_state(from_experiment=from_experiment))
-        shutter_data = {'open': shutter_state['state'] == 'OPEN'}
-        source_data = {'voltage': self.source_voltage,
-                       'current': self.source_current}
-
-        return json.dumps({'image_data': image_data,
-                           'object': object_data,
-                           'shutter': shutter_data,
-                           'X-ray source': source_data})
+        return self.state.exposure
+
+    def get_detector_frame(self, from_experiment=False, state=None):
+        if state is None:
+            state = self.state
+
+        seed = self.current_experiment.seed if from_experiment else None
+        if seed is None:
+            return FrameMetadata(timestamp=time.time(), model=DETECTOR_MODEL, state=state)
+        # replayed experiment has the same timestamps in every run
+        return FrameMetadata(timestamp=REPLAY_EPOCH + self.current_experiment.clock, model=DETECTOR_MODEL,
+                             state=state, seed=seed, utc=True)
+
+    def create_experiment(self, exp_param):
+        with self.lock:
+            if self.current_experiment is not None:
+                raise ModExpError(error='On this tomograph experiment is running')
+            if exp_param['advanced']:
+                self.current_experiment = AdvancedExperiment(tomograph=self, exp_param=exp_param)
+                return None
+            self.current_experiment = Experiment(tomograph=self, exp_param=exp_param)
+            return self.predict_duration(self.current_experiment.scan_plan)
+
+    def predict_duration(self, scan_plan):
+        state = self.state
+        return self.timing.predict_plan_duration(scan_plan,
+                                                 angle_position=state.angle_position,
+                                                 x_position=state.x_position,
+                                                 away_x_position=AWAY_X_POSITION)
+
+    def preview_scan_plan(self, exp_param, offset=0, limit=PLAN_PREVIEW_FRAMES):
+        scan_plan = ScanPlan.compile(exp_param, initial_angle=self.state.angle_position)
+        preview = scan_plan.to_dict(offset, limit)
+        preview['predicted duration'] = self.predict_duration(scan_plan)
+        return preview
+
+    def start_experiment(self, exp_param):
+        predicted_duration = self.create_experiment(exp_param)
+        self.experiment_thread = threading.Thread(target=self.run_current_experiment,
+                                                  name='tomograph-{}-experiment'.format(self.tomo_num))
+        self.experiment_thread.start()
+        return predicted_duration
 
     def carry_out_simple_experiment(self, exp_param):
-        time_of_experiment_start = time.time()
-        self.current_experiment = Experiment(tomograph=self, exp_param=exp_param)
+        self.create_experiment(exp_param)
+        self.run_current_experiment()
+
+    def carry_out_advanced_experiment(self, exp_param):
+        self.create_experiment(exp_param)
+        self.run_current_experiment()
 
-        exp_id = self.current_experiment.exp_id
+    def run_current_experiment(self):
+        experiment = self.current_experiment
+        exp_id = experiment.exp_id
+        experiment.start_time = time.time()
+        self.progress.publish('start', experiment.progress_event())
 
         try:
-            self.current_experiment.run()
+            experiment.run()
+            # frames still in upload queue may fail after acquisition is over
+            experiment.wait_uploads()
+            if experiment.to_be_stopped:
+                raise experiment.stop_exception
+            experiment.flush_frames()
         except ModExpError as e:
+            experiment.stop(e)
+            experiment.wait_uploads()
+            # frames taken before stop are still sent
+            try:
+                experiment.flush_frames()
+            except ModExpError:
+                pass
+            self.last_stop_latency = time.time() - experiment.stop_time
+            print('Experiment {} was stopped in {:.3f} s'.format(exp_id, self.last_stop_latency))
             event_for_send = e.to_event_dict(exp_id)
             stop_msg = e.stop_msg
         else:
             event_for_send = create_event(event_type='message', exp_id=exp_id, MoF=SUCCESSFUL_STOP_MSG)
             stop_msg = SUCCESSFUL_STOP_MSG
 
-        send_message_to_storage_webpage(event_for_send)
+        finish_event = experiment.progress_event()
+        finish_event.update(message=stop_msg, error=event_for_send['error'])
+        self.progress.publish('finish', finish_event)
+
+        send_message_to_storage_webpage(event_for_send, storage_client=self.storage_client,
+                                        frame_spool=self.frame_spool)
 
         self.current_experiment = None
+
+
+def batch_result(tomograph, result):
+    # frame in batch is replaced by its metadata and statistics, image itself is taken by /detector/get-frame
+    if not isinstance(result, Frame):
+        return result
+    raw_image = result.raw_image
+    try:
+        return {'metadata': result.metadata.to_dict(),
+                'min': int(raw_image.min()),
+                'max': int(raw_image.max()),
+                'mean': float(raw_image.mean())}
+    finally:
+        tomograph.frame_source.release(raw_image)
+
+
+def create_frame_cache(tomo_num):
+    directory = None
+    if FRAME_CACHE_DIR is not None:
+        directory = os.path.join(FRAME_CACHE_DIR, 'tomograph-{}'.format(tomo_num))
+    return FrameCache(max_bytes=FRAME_CACHE_BYTES, directory=directory)
+
+
+def frame_spool_directory(spool_dir, tomo_num):
+    return os.path.join(spool_dir, 'tomograph-{}'.format(tomo_num))
+
+
+def create_frame_spool(tomo_num, storage_client, spool_dir=FRAME_SPOOL_DIR):
+    # None - frames are sent to storage by upload workers, failed request stops experiment
+    if spool_dir is None:
+        return None
+    return FrameSpool(directory=frame_spool_directory(spool_dir, tomo_num),
+                      max_bytes=FRAME_SPOOL_BYTES,
+                      send=lambda *request: send_spooled_request(storage_client, *request),
+                      full_timeout=FRAME_SPOOL_FULL_TIMEOUT,
+                      retry_backoff=STORAGE_RETRY_BACKOFF,
+                      max_backoff=FRAME_SPOOL_MAX_BACKOFF,
+                      rejected_errors=(StorageRejectedError,))
+
+
+def create_timing_model(speedup=TIMING_SPEEDUP):
+    return TimingModel(speedup=speedup,
+                       angle_speed=MOTOR_ANGLE_SPEED,
+                       x_speed=MOTOR_X_SPEED,
+                       shutter_latency=SHUTTER_LATENCY,
+                       readout_time=DETECTOR_READOUT_TIME,
+                       source_ramp_time=SOURCE_RAMP_TIME,
+                       source_off_pause=SOURCE_OFF_PAUSE,
+                       dark_settle_time=DARK_SETTLE_TIME)
+
+
+class TomographRegistry:
+    # tomographs are created on first request and don't share any state except phantom volume,
+    # each app has its own registry
+    def __init__(self, tomographs_count=TOMOGRAPHS_COUNT, storage_uri=STORAGE_URI, timing_speedup=TIMING_SPEEDUP,
+                 frame_shape=(DETECTOR_FRAME_HEIGHT, DETECTOR_FRAME_WIDTH), frame_simulation=FRAME_SIMULATION,
+                 frame_spool_dir=FRAME_SPOOL_DIR):
+        self.tomographs_count = tomographs_count
+        self.storage_uri = storage_uri
+        self.timing_speedup = timing_speedup
+        self.frame_shape = frame_shape
+        self.frame_simulation = frame_simulation
+        self.frame_spool_dir = frame_spool_dir
+        self.tomographs = {}
+        self.lock = threading.Lock()
+
+        # tomographs with requests left in spool by previous run are created at once, so spool is drained
+        if frame_spool_dir is not None:
+            for tomo_num in range(tomographs_count):
+                if spool_has_pending(frame_spool_directory(frame_spool_dir, tomo_num)):
+                    self.get(tomo_num)
+
+    def create_tomograph(self, tomo_num):
+        return Tomograph(tomo_num,
+                         timing=create_timing_model(self.timing_speedup),
+                         frame_shape=self.frame_shape,
+                         storage_client=create_storage_client(self.storage_uri),
+                         frame_simulation=self.frame_simulation,
+                         frame_spool_dir=self.frame_spool_dir)
+
+    def get(self, tomo_num):
+        if not (0 <= tomo_num < self.tomographs_count):
+            raise ModExpError(error='There is no tomograph with number {}'.format(tomo_num))
+
+        tomograph = self.tomographs.get(tomo_num)
+        if tomograph is None:
+            with self.lock:
+                tomograph = self.tomographs.get(tomo_num)
+                if tomograph is None:
+                    tomograph = self.create_tomograph(tomo_num)
+                    self.tomographs[tomo_num] = tomograph
+        return tomograph
+
+    def created(self, tomo_num):
+        return tomo_num in self.tomographs
+
+
+@lru_cache(maxsize=None)
+def phantom_volume():
+    if PHANTOM_PATH is not None:
+        return load_volume(PHANTOM_PATH)
+    return shepp_logan_volume(PHANTOM_SIZE)
+
+
+def create_simulator(height=DETECTOR_FRAME_HEIGHT, width=DETECTOR_FRAME_WIDTH, simulation=FRAME_SIMULATION):
+    if simulation != 'projection':
+        return None
+
+    return ProjectionSimulator(volume=phantom_volume(),
+                               height=height,
+                               width=width,
+                               attenuation=PHANTOM_ATTENUATION,
+                               counts_scale=DETECTOR_COUNTS_SCALE,
+                               dark_level=DETECTOR_DARK_LEVEL,
+                               pixels_per_x_unit=DETECTOR_PIXELS_PER_X_UNIT,
+                               seed=FRAME_NOISE_SEED)
+
+
+def create_registry(config):
+    # registry of app by its config, see config.py
+    return TomographRegistry(tomographs_count=config['TOMOGRAPHS_COUNT'],
+                             storage_uri=config['STORAGE_URI'],
+                             timing_speedup=config['TIMING_SPEEDUP'],
+                             frame_shape=(config['DETECTOR_FRAME_HEIGHT'], config['DETECTOR_FRAME_WIDTH']),
+                             frame_simulation=config['FRAME_SIMULATION'],
+                             frame_spool_dir=config['FRAME_SPOOL_DIR'])
@@ -0,0 +1,13 @@
+import importlib
+import os
+import sys
+
+# package directory has hyphen in its name, so test modules import its modules by package_module
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+PACKAGE = 'experiment-mock'
+
+
+def package_module(name=None):
+    # the package itself without name
+    return importlib.import_module(PACKAGE if name is None else '{}.{}'.format(PACKAGE, name))
@@ -0,0 +1,56 @@
+import pytest
+
+from conftest import package_module
+
+benchmark = package_module('benchmark')
+storage_stub = package_module('storage_stub')
+create_app = package_module().create_app
+
+# cases run with small frames, so every case is checked quickly
+TEST_FRAME_SHAPE = (32, 32)
+
+
+@pytest.fixture(scope='module')
+def stub():
+    with storage_stub.StubStorageServer() as stub:
+        yield stub
+
+
+def check_summary(summary, rounds):
+    assert summary['rounds'] == rounds
+    assert 0 <= summary['min'] <= summary['median'] <= summary['max']
+    assert summary['min'] <= summary['mean'] <= summary['max']
+
+
+@pytest.mark.parametrize('case', benchmark.BENCHMARK_CASES, ids=[case['name'] for case in benchmark.BENCHMARK_CASES])
+def test_experiment_case(case, stub):
+    small_case = dict(case, **{'frame shape': TEST_FRAME_SHAPE})
+    result = benchmark.run_experiment_case(small_case, repeat=2, stub=stub)
+
+    assert result['case'] == case['name']
+    assert result['frame shape'] == list(TEST_FRAME_SHAPE)
+    assert result['frames'] == case['dark'] + case['empty'] + case['steps'] * case['count per step']
+    check_summary(result['duration'], rounds=2)
+    assert result['frames per second'] > 0
+    assert result['sent MB per second'] > 0
+    assert result['storage']['errors'] == 0
+    assert (result['frame cache'] is not None) == bool(case.get('frame cache'))
+
+
+def test_routes_case():
+    app = create_app(benchmark.STARTUP_CONFIG)
+    result = benchmark.run_routes_case(app, clients=2, requests_count=16)
+
+    assert result['clients'] == 2
+    assert result['requests'] == 16
+    assert set(result['routes']) == set(benchmark.BENCHMARK_ROUTES)
+    for route_result in result['routes'].values():
+        assert route_result['requests'] == 4
+        assert 0 < route_result['p50'] <= route_result['p95'] <= route_result['max']
+
+
+def test_unknown_case_is_not_run():
+    app = create_app(benchmark.STARTUP_CONFIG)
+    results = benchmark.run_benchmarks(app, case_names=('no-such-case',), clients=0)
+    assert results['experiments'] == []
+    assert 'control routes' not in results
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from conftest import package_module
+
+frame_batcher = package_module('frame_batcher')
+
+
+class RecordingSender:
+    def __init__(self):
+        self.batches = []
+        self.sent = threading.Event()
+        self.error = None
+
+    def send_batch(self, index, frames_data):
+        if self.error is not None:
+            raise self.error
+        self.batches.append([frame_index['frame']['number'] for frame_index in index])
+        self.sent.set()
+
+
+def add_frames(batcher, numbers, mode='data'):
+    for number in numbers:
+        batcher.add({'mode': mode, 'number': number}, b'frame')
+
+
+def test_batch_is_sent_by_count_bytes_and_mode():
+    sender = RecordingSender()
+    batcher = frame_batcher.FrameBatcher(sender.send_batch, max_count=3, max_bytes=100, max_delay=10)
+    add_frames(batcher, range(4), mode='dark')
+    add_frames(batcher, range(4, 6))
+    batcher.flush()
+    assert sender.batches == [[0, 1, 2], [3], [4, 5]]
+
+
+def test_batch_is_sent_by_time_without_next_frame():
+    sender = RecordingSender()
+    batcher = frame_batcher.FrameBatcher(sender.send_batch, max_count=10, max_bytes=1000, max_delay=0.05)
+    start = time.time()
+    add_frames(batcher, range(2))
+    assert sender.sent.wait(2)
+    assert time.time() - start >= 0.05
+    assert sender.batches == [[0, 1]]
+
+
+def test_timer_of_sent_batch_does_not_send_next_one():
+    sender = RecordingSender()
+    batcher = frame_batcher.FrameBatcher(sender.send_batch, max_count=2, max_bytes=1000, max_delay=0.2)
+    add_frames(batcher, range(2))
+    time.sleep(0.1)
+    add_frames(batcher, [2])
+    time.sleep(0.15)
+    # timer of the first batch is over, the second batch waits for its own timer
+    assert sender.batches == [[0, 1]]
+    batcher.flush()
+    assert sender.batches == [[0, 1], [2]]
+
+
+def test_error_of_batch_sent_by_timer_is_raised_by_next_add():
+    sender = RecordingSender()
+    sender.error = RuntimeError('storage is down')
+    batcher = frame_batcher.FrameBatcher(sender.send_batch, max_count=10, max_bytes=1000, max_delay=0.01)
+    add_frames(batcher, [0])
+    time.sleep(0.1)
+    with pytest.raises(RuntimeError, match='storage is down'):
+        add_frames(batcher, [1])
+    sender.error = None
+    batcher.flush()
+    assert sender.batches == []
@@ -0,0 +1,44 @@
+import io
+import zipfile
+import zlib
+
+import numpy as np
+import pytest
+
+from conftest import package_module
+
+frame_codecs = package_module('frame_codecs')
+
+CODEC_NAMES = ('npz', 'npy', 'zlib', 'lz4', 'zstd', 'fast')
+
+
+def decompress(codec_name, data):
+    if codec_name == 'npz':
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return archive.read('frame_data.npy')
+    if codec_name == 'zlib':
+        return zlib.decompress(data)
+    if codec_name == 'lz4':
+        return pytest.importorskip('lz4.frame').decompress(data)
+    if codec_name == 'zstd':
+        return pytest.importorskip('zstandard').ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+@pytest.mark.parametrize('codec_name', CODEC_NAMES)
+def test_codec_round_trip(codec_name):
+    if codec_name not in frame_codecs.CODECS:
+        pytest.skip('{} is not installed'.format(codec_name))
+    codec = frame_codecs.get_codec(codec_name)
+    image = np.arange(64 * 48, dtype=np.uint16).reshape(64, 48)
+    data = codec.encode(image).read()
+
+    name = codec.name if codec_name == 'fast' else codec_name
+    restored = np.load(io.BytesIO(decompress(name, data)))
+    assert restored.dtype == image.dtype
+    assert np.array_equal(restored, image)
+
+
+def test_lz4_codec_is_available_with_lz4_installed():
+    pytest.importorskip('lz4.frame')
+    assert frame_codecs.CODECS['fast'].name == 'lz4'
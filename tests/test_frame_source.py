@@ -0,0 +1,29 @@
+import gc
+
+import numpy as np
+
+from conftest import package_module
+
+frame_source = package_module('frame_source')
+
+
+def test_leaked_shared_buffer_is_not_confused_with_other_array():
+    pool = frame_source.FrameBufferPool((4, 4), np.uint16, buffers_count=2, shared=True)
+    names = {pool.block_name(buffer) for buffer in pool.free_buffers}
+    leaked = pool.acquire()
+    leaked_name = pool.block_name(leaked)
+    assert leaked_name in names
+    del leaked
+    gc.collect()
+
+    kept = pool.acquire()
+    allocated = [pool.acquire() for i in range(100)]
+    assert pool.block_name(kept) in names - {leaked_name}
+    assert all(pool.block_name(buffer) is None for buffer in allocated)
+
+    for buffer in allocated:
+        pool.release(buffer)
+    assert pool.free_buffers == []
+    pool.release(kept)
+    assert pool.free_buffers[0] is kept
+    pool.unlink()
@@ -0,0 +1,112 @@
+import io
+import random
+import threading
+
+from conftest import package_module
+
+frame_spool = package_module('frame_spool')
+
+
+def create_spool(directory, send, max_bytes=100):
+    return frame_spool.FrameSpool(directory=str(directory), max_bytes=max_bytes, send=send, full_timeout=10,
+                                  retry_backoff=0.001, max_backoff=0.001)
+
+
+class RecordingStorage:
+    # sent requests in order, fails randomly like storage that goes down and up
+    def __init__(self, fail_ratio=0.0, seed=0):
+        self.fail_ratio = fail_ratio
+        self.random = random.Random(seed)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def send(self, uri, data, file_name, frame_file):
+        if self.random.random() < self.fail_ratio:
+            raise ConnectionError('storage is down')
+        with self.lock:
+            self.requests.append((uri, data, frame_file.read() if frame_file is not None else None))
+
+
+def append_requests(spool, count, seed=0):
+    rng = random.Random(seed)
+    appended = []
+    for i in range(count):
+        size = rng.choice((0, 0, 1, 7, 20, 33, 50, 100))
+        if size == 0 and rng.random() < 0.5:
+            # message without file, like finish of experiment
+            request = ('finish', {'num': i}, None)
+            spool.append(request[0], request[1])
+        else:
+            request = ('frames', {'num': i}, bytes(rng.randrange(256) for j in range(size)))
+            spool.append(request[0], request[1], 'frame', io.BytesIO(request[2]))
+        appended.append(request)
+    return appended
+
+
+def test_ring_wraps_and_keeps_order(tmp_path):
+    for seed in range(5):
+        storage = RecordingStorage(fail_ratio=0.3, seed=seed)
+        spool = create_spool(tmp_path / str(seed), storage.send)
+        appended = append_requests(spool, 200, seed=seed)
+        assert spool.wait_drained(timeout=30)
+        assert storage.requests == [(uri, data, payload) for uri, data, payload in appended]
+        assert spool.stats()['pending'] == 0
+
+
+def test_full_ring_of_equal_files_with_messages(tmp_path):
+    # files fill ring exactly, so tail comes to head and message without file lands right there
+    storage = RecordingStorage(fail_ratio=0.5, seed=1)
+    spool = create_spool(tmp_path, storage.send)
+    appended = []
+    for i in range(50):
+        payload = bytes([i]) * 25
+        spool.append('frames', {'num': i}, 'frame', io.BytesIO(payload))
+        appended.append(('frames', {'num': i}, payload))
+        if i % 4 == 3:
+            spool.append('finish', {'num': i})
+            appended.append(('finish', {'num': i}, None))
+    assert spool.wait_drained(timeout=30)
+    assert storage.requests == appended
+
+
+def test_pending_requests_are_sent_after_restart(tmp_path):
+    down = threading.Event()
+
+    def send_to_down_storage(uri, data, file_name, frame_file):
+        down.wait(0.01)
+        raise ConnectionError('storage is down')
+
+    spool = create_spool(tmp_path, send_to_down_storage)
+    appended = append_requests(spool, 6, seed=3)
+    assert spool.stats()['pending'] == 6
+    assert frame_spool.spool_has_pending(str(tmp_path))
+
+    storage = RecordingStorage()
+    restarted = create_spool(tmp_path, storage.send)
+    assert restarted.wait_drained(timeout=10)
+    assert storage.requests == appended
+
+
+def test_rejected_request_is_moved_aside(tmp_path):
+    class Rejected(Exception):
+        pass
+
+    sent = []
+
+    def send(uri, data, file_name, frame_file):
+        if data['num'] == 1:
+            raise Rejected('result is not success')
+        sent.append(data['num'])
+
+    spool = frame_spool.FrameSpool(directory=str(tmp_path), max_bytes=100, send=send, full_timeout=10,
+                                   retry_backoff=0.001, max_backoff=0.001, rejected_errors=(Rejected,))
+    for num in range(3):
+        spool.append('frames', {'num': num}, 'frame', io.BytesIO(bytes([num]) * 10))
+    assert spool.wait_drained(timeout=10)
+
+    assert sent == [0, 2]
+    stats = spool.stats()
+    assert stats['rejected'] == 1 and stats['drained'] == 2 and stats['errors'] == 0
+    with open(stats['last rejected']['path'], 'rb') as f:
+        assert f.read() == bytes([1]) * 10
+    assert (tmp_path / 'rejected.jsonl').read_text().count('\n') == 1
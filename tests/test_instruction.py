@@ -0,0 +1,90 @@
+import pytest
+
+from conftest import package_module
+
+instruction = package_module('instruction')
+
+
+class Stopped(Exception):
+    pass
+
+
+class FakeExperiment:
+    # instruction without tomograph functions needs only stop of experiment
+    tomograph = None
+    to_be_stopped = False
+    stop_exception = Stopped()
+
+
+def run(source, experiment=None):
+    namespace = instruction.instruction_namespace(experiment or FakeExperiment())
+    exec(instruction.compile_instruction(source), namespace)
+    return namespace
+
+
+@pytest.mark.parametrize('source', [
+    'x = wait.__name__',
+    'x = __import__',
+    'x = _hidden',
+    'while True:\n    pass',
+    'open("/etc/passwd")',
+    'x = [i for i in range(3)]',
+    'import os',
+    'def f():\n    pass',
+    'x = lambda: 1',
+    'x = a[0]',
+    'range = 1',
+    'x = 1 ** 2',
+])
+def test_unacceptable_instruction_is_not_compiled(source):
+    with pytest.raises(instruction.InstructionError):
+        instruction.compile_instruction(source)
+
+
+def test_syntax_error_is_instruction_error():
+    with pytest.raises(instruction.InstructionError, match='Syntax error'):
+        instruction.compile_instruction('for')
+
+
+def test_loops_and_arithmetic_work_as_python():
+    namespace = run('x = 1\nx += 2\nx -= 1\ny = [1, 2] + [3]\ns = "a" + "b"\nz = 0\n'
+                    'for i in range(10):\n    for j in [1, 2]:\n        z = z + i * j - 7 // 2 % 5 / 2\n'
+                    'if z > 0 and not y == []:\n    w = max(abs(-z), round(1.6), int(2.5), float(1))')
+    assert (namespace['x'], namespace['y'], namespace['s']) == (2, [1, 2, 3], 'ab')
+    assert namespace['z'] == sum(i * j - 7 // 2 % 5 / 2 for i in range(10) for j in (1, 2))
+    assert namespace['w'] == namespace['z']
+
+
+def test_loop_iterations_are_limited_for_all_loops(monkeypatch):
+    monkeypatch.setattr(instruction, 'MAX_LOOP_ITERATIONS', 1000)
+    run('for i in range(10):\n    for j in range(90):\n        pass')
+    with pytest.raises(instruction.InstructionError, match='Loops are too long'):
+        run('for i in range(10):\n    for j in range(100):\n        pass')
+    with pytest.raises(instruction.InstructionError, match='Loop is too long'):
+        run('for i in range({}):\n    pass'.format(instruction.MAX_LOOP_LENGTH + 1))
+
+
+def test_loop_is_interrupted_by_stop():
+    experiment = FakeExperiment()
+    namespace = instruction.instruction_namespace(experiment)
+    # experiment is stopped while tomograph function runs, loop doesn't go on after it
+    namespace['wait'] = lambda seconds: setattr(experiment, 'to_be_stopped', True)
+    code = instruction.compile_instruction('n = 0\nfor i in range(100):\n    n += 1\n    if i == 2:\n        wait(0)')
+    with pytest.raises(Stopped):
+        exec(code, namespace)
+    assert namespace['n'] == 3
+
+
+@pytest.mark.parametrize('source, message', [
+    ('s = "a" * 3', 'Only numbers'),
+    ('s = [1] * 3', 'Only numbers'),
+    ('s = 3 * "a"', 'Only numbers'),
+    ('x = 3\nfor i in range(20):\n    x *= x', 'Integer is too big'),
+    ('x = 1\nfor i in range(2000):\n    x = x + x', 'Integer is too big'),
+    ('x = -1\nfor i in range(2000):\n    x -= -x', 'Integer is too big'),
+    ('s = "a"\nfor i in range(30):\n    s = s + s', 'Sequence is too long'),
+    ('s = [1]\nfor i in range(30):\n    s += s', 'Sequence is too long'),
+])
+def test_results_of_arithmetic_are_limited(source, message):
+    with pytest.raises(instruction.InstructionError, match=message):
+        run(source)
@@ -0,0 +1,44 @@
+from conftest import package_module
+
+progress = package_module('progress')
+
+
+def event_types(messages):
+    return [message.split(b'\n')[1].decode()[len('event: '):] for message in messages]
+
+
+def publish_experiment(broadcaster, frames_per_phase):
+    broadcaster.publish('start', {'frame': 0})
+    frame = 0
+    for phase in ('dark', 'empty', 'data'):
+        broadcaster.publish('phase', {'phase': phase})
+        for i in range(frames_per_phase):
+            frame += 1
+            broadcaster.publish('progress', {'frame': frame})
+    broadcaster.publish('finish', {'frame': frame})
+
+
+def test_slow_watcher_gets_every_phase_and_latest_progress():
+    broadcaster = progress.ProgressBroadcaster(heartbeat=0.01, max_events=16)
+    stream = broadcaster.stream()
+    assert next(stream) == progress.HEARTBEAT_MESSAGE
+
+    publish_experiment(broadcaster, frames_per_phase=3)
+    messages = [next(stream) for i in range(6)]
+    assert event_types(messages) == ['start', 'phase', 'phase', 'phase', 'progress', 'finish']
+    assert b'"frame":9' in messages[4]
+    assert next(stream) == progress.HEARTBEAT_MESSAGE
+    stream.close()
+    assert broadcaster.subscribers == 0
+
+
+def test_new_watcher_gets_events_of_the_latest_experiment():
+    broadcaster = progress.ProgressBroadcaster(heartbeat=0.01, max_events=16)
+    publish_experiment(broadcaster, frames_per_phase=2)
+    broadcaster.publish('start', {'frame': 0})
+    broadcaster.publish('phase', {'phase': 'dark'})
+    broadcaster.publish('progress', {'frame': 1})
+
+    stream = broadcaster.stream()
+    assert event_types([next(stream) for i in range(3)]) == ['start', 'phase', 'progress']
+    stream.close()
@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import package_module
+
+scan_plan = package_module('scan_plan')
+experiment = package_module('experiment')
+constants = package_module('constants')
+
+
+def exp_param(dark=2, empty=3, step_count=10, count_per_step=2, interleave=0, angle_step=1.0):
+    return {
+        'exp_id': 'test',
+        'advanced': False,
+        'DARK': {'count': dark, 'exposure': 1.0},
+        'EMPTY': {'count': empty, 'exposure': 1.0, 'interleave': interleave},
+        'DATA': {'step count': step_count, 'count per step': count_per_step, 'exposure': 1.0,
+                 'angle step': angle_step},
+    }
+
+
+@pytest.mark.parametrize('step_count, interleave', [(10, 0), (10, 3), (9, 3), (1, 5), (0, 2), (10, 1)])
+def test_frames_count_equals_compiled_plan_size(step_count, interleave):
+    param = exp_param(step_count=step_count, interleave=interleave)
+    assert scan_plan.frames_count(param) == len(scan_plan.ScanPlan.compile(param))
+
+
+def test_too_many_frames_are_rejected_before_plan_is_built(monkeypatch):
+    def compile_plan(*args, **kwargs):
+        raise AssertionError('plan must not be built')
+
+    monkeypatch.setattr(scan_plan.ScanPlan, 'compile', compile_plan)
+    param = exp_param(step_count=constants.MAX_EXPERIMENT_FRAMES, count_per_step=2 ** 40)
+    success, error = experiment.check_and_prepare_exp_parameters(param)
+    assert not success
+    assert 'Too many frames' in error
+
+
+def test_infinite_angle_step_is_rejected():
+    success, error = experiment.check_and_prepare_exp_parameters(exp_param(angle_step=float('inf')))
+    assert not success
+    assert 'finite' in error
+
+
+def test_preview_is_paginated():
+    plan = scan_plan.ScanPlan.compile(exp_param())
+    preview = plan.to_dict(offset=20, limit=4)
+    assert preview['frames count'] == len(plan) == 25
+    assert preview['frame num'] == [20, 21, 22, 23]
+    assert sum(preview['counts'].values()) == 25
+    assert plan.to_dict(offset=30, limit=4)['frame num'] == []
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from conftest import package_module
+
+storage_client = package_module('storage_client')
+storage_stub = package_module('storage_stub')
+constants = package_module('constants')
+
+CREATE_URI = constants.STORAGE_URI + '/storage/experiments/create'
+FRAMES_URI = constants.STORAGE_URI + '/storage/frames/post'
+
+
+@pytest.fixture
+def stub():
+    with storage_stub.StubStorageServer() as stub:
+        yield stub
+
+
+def create_client(stub, retries=3):
+    return storage_client.StorageClient(pool_size=2, connect_timeout=1, read_timeout=5, retries=retries,
+                                        backoff=0.001, storage_uri=stub.uri)
+
+
+def test_requests_to_storage_uri_go_to_stub(stub):
+    client = create_client(stub)
+    assert client.post(CREATE_URI, data='{}') == {'result': 'success'}
+    assert stub.requests == ['/storage/experiments/create']
+
+
+def test_idempotent_request_is_retried_after_5xx(stub):
+    client = create_client(stub)
+    frame = b'frame bytes' * 100
+    client.post(FRAMES_URI, data={'data': '{}'}, files={'file': ('frame', io.BytesIO(frame))}, idempotent=True)
+    single_request_bytes = stub.received_bytes
+
+    stub.fail_count = 2
+    client.post(FRAMES_URI, data={'data': '{}'}, files={'file': ('frame', io.BytesIO(frame))}, idempotent=True)
+
+    assert len(stub.requests) == 4
+    # file is sent from its beginning in every attempt
+    assert stub.received_bytes == 4 * single_request_bytes
+    stats = client.stats()
+    assert (stats['requests'], stats['retries'], stats['errors']) == (4, 2, 0)
+
+
+def test_idempotent_request_fails_when_retries_are_over(stub):
+    client = create_client(stub, retries=2)
+    stub.fail_count = 5
+    with pytest.raises(storage_client.StorageError, match='status 503') as e:
+        client.post(FRAMES_URI, data={'data': '{}'}, idempotent=True)
+    assert not isinstance(e.value, storage_client.StorageRejectedError)
+    assert len(stub.requests) == 3
+    assert client.stats()['errors'] == 1
+
+
+def test_not_idempotent_request_is_not_retried(stub):
+    client = create_client(stub)
+    stub.fail_count = 1
+    with pytest.raises(storage_client.StorageError):
+        client.post(CREATE_URI, data='{}')
+    assert len(stub.requests) == 1
+
+    client.post(CREATE_URI, data='{}')
+    assert len(stub.requests) == 2
+    stats = client.stats()
+    assert (stats['retries'], stats['errors']) == (0, 1)
+
+
+def test_stats_have_latencies_of_requests():
+    with storage_stub.StubStorageServer(delay=0.02) as stub:
+        client = create_client(stub)
+        assert 'latency' not in client.stats()
+        for i in range(5):
+            client.post(CREATE_URI, data='{}')
+
+    latency = client.stats()['latency']
+    assert 0.02 <= latency['p50'] <= latency['p95'] <= latency['max']
+    assert 0.02 <= latency['mean'] <= latency['max']